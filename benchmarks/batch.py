@@ -0,0 +1,107 @@
+"""
+Benchmark of the scheduling of BatchCrawler against the local fake YouTube
+from benchmarks.fake_youtube.
+
+Usage:
+    python -m benchmarks.batch [--channels 2] [--videos 60] [--latency 0.02]
+                               [--max-concurrency 8]
+
+Crawls one channel alone and then `--channels` channels in one batch. The
+channels of a batch take turns at one pool of workers, so they should all
+progress during the whole batch rather than one after the other. Reports,
+for every channel, when it finished its first and its last video, and the
+time during which all the channels were making progress.
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from benchmarks.crawl import start_server
+from crawler.batch import BatchCrawler
+
+
+def crawl(
+    args: argparse.Namespace,
+    url: str,
+    channels: list,
+) -> tuple:
+    """Crawls the channels in one batch, returns the elapsed time and their (first, last) progress"""
+    lock = threading.Lock()
+    progress = {}
+    start = time.perf_counter()
+
+    def progress_callback(
+        name: str,
+        value: float,
+    ) -> None:
+        if value <= 0:
+            return
+        now = time.perf_counter() - start
+        with lock:
+            first, _ = progress.get(name, (now, now))
+            progress[name] = (first, now)
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = BatchCrawler(
+            channels,
+            rate=args.rate,
+            max_concurrency=args.max_concurrency,
+            channel_workers=len(channels),
+            base_url=url,
+        ).run(
+            progress_callback,
+            video_amount=args.videos,
+            comment_amount=args.comments,
+            path=os.path.join(directory, "youtube.db"),
+        )
+    elapsed = time.perf_counter() - start
+
+    for name, error in results.items():
+        if error is not None:
+            raise RuntimeError(f"{name} failed:\n{error}")
+    return elapsed, progress
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--channels", type=int, default=2)
+    parser.add_argument("--videos", type=int, default=60)
+    parser.add_argument("--comments", type=int, default=100)
+    parser.add_argument("--comment-pages", type=int, default=5)
+    parser.add_argument("--comments-per-page", type=int, default=20)
+    parser.add_argument("--replies", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--max-concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=1000.0)
+    args = parser.parse_args()
+
+    process, url = start_server(args)
+    try:
+        single, _ = crawl(args, url, ["@single"])
+        channels = [f"@channel{number}" for number in range(args.channels)]
+        elapsed, progress = crawl(args, url, channels)
+    finally:
+        process.terminate()
+        process.wait()
+
+    print(f"{'one channel':>20}: {single:8.2f} s")
+    print(
+        f"{f'{len(channels)} channels':>20}: {elapsed:8.2f} s, x{elapsed / single:.2f}"
+    )
+    for name in channels:
+        first, last = progress.get(name, (float("nan"), float("nan")))
+        print(f"{name:>20}: progress from {first:6.2f} s to {last:6.2f} s")
+
+    # Time during which every channel was making progress
+    overlap = min(last for _, last in progress.values()) - max(
+        first for first, _ in progress.values()
+    )
+    print(
+        f"{'overlap':>20}: {max(overlap, 0):8.2f} s ({max(overlap, 0) / elapsed:.0%})"
+    )
+
+
+if __name__ == "__main__":
+    main()
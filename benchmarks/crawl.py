@@ -0,0 +1,195 @@
+"""
+End-to-end throughput benchmark of YouTubeCrawler.load_channel against the local
+fake YouTube from benchmarks.fake_youtube.
+
+Usage:
+    python -m benchmarks.crawl [--videos 60] [--latency 0.02] [--workers 4]
+                               [--save baseline.json] [--compare baseline.json]
+
+The fake YouTube runs in its own process, so that it doesn't compete with the
+crawler for the GIL. Reports requests/s, comments/s, database rows/s and the
+peak RSS of the crawler process.
+"""
+import argparse
+import json
+import os
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from crawler.crawler import YouTubeCrawler
+
+
+TABLES = (
+    "channels",
+    "videos",
+    "comments",
+    "users",
+    "user_files",
+    "video_files",
+    "channel_files",
+)
+
+
+def peak_rss() -> int:
+    """Peak resident set size of the process in bytes"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def count_rows(
+    path: str,
+) -> dict:
+    connection = sqlite3.connect(path)
+    rows = {
+        table: connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        for table in TABLES
+    }
+    connection.close()
+    return rows
+
+
+def start_server(
+    args: argparse.Namespace,
+) -> tuple:
+    """Starts benchmarks.fake_youtube in a subprocess, returns the process and its URL"""
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.fake_youtube",
+            "--port=0",
+            f"--videos={args.videos}",
+            f"--comment-pages={args.comment_pages}",
+            f"--comments-per-page={args.comments_per_page}",
+            f"--replies={args.replies}",
+            f"--latency={args.latency}",
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    url = process.stdout.readline().rsplit(" ", 1)[-1].strip()
+    return process, url
+
+
+def server_requests(
+    url: str,
+) -> int:
+    with urllib.request.urlopen(f"{url}/__stats") as response:
+        return sum(json.load(response)["requests"].values())
+
+
+def run(
+    args: argparse.Namespace,
+) -> dict:
+    process, url = start_server(args)
+    if args.parse_processes:
+        pool = ProcessPoolExecutor(args.parse_processes)
+    else:
+        pool = nullcontext()
+
+    try:
+        with tempfile.TemporaryDirectory() as directory, pool as parser:
+            path = os.path.join(directory, "youtube.db")
+            crawler = YouTubeCrawler(
+                "@benchmark",
+                workers=args.workers,
+                base_url=url,
+                parser=parser,
+                parsers=args.parsers or max(1, args.parse_processes),
+                queue_size=args.queue_size,
+            )
+
+            start = time.perf_counter()
+            crawler.load_channel(
+                lambda progress: None,
+                video_amount=args.videos,
+                comment_amount=args.comments,
+                path=path,
+            )
+            elapsed = time.perf_counter() - start
+
+            depths = crawler.pipeline.peak_depths if crawler.pipeline else {}
+            stages = crawler.stats.snapshot()
+            rows = count_rows(path)
+            requests = server_requests(url)
+    finally:
+        process.terminate()
+        process.wait()
+
+    return {
+        "elapsed": elapsed,
+        "requests": requests,
+        "requests_per_second": requests / elapsed,
+        "comments_per_second": rows["comments"] / elapsed,
+        "rows_per_second": sum(rows.values()) / elapsed,
+        "peak_rss": peak_rss(),
+        "rows": rows,
+        "peak_queue_depths": depths,
+        "stages": stages,
+    }
+
+
+def report(
+    result: dict,
+    baseline: dict = None,
+) -> None:
+    metrics = (
+        ("elapsed", "s", False),
+        ("requests_per_second", "requests/s", True),
+        ("comments_per_second", "comments/s", True),
+        ("rows_per_second", "rows/s", True),
+        ("peak_rss", "bytes peak RSS", False),
+    )
+    for name, unit, higher_is_better in metrics:
+        line = f"{name:>20}: {result[name]:14.2f} {unit}"
+        if baseline and baseline.get(name):
+            change = result[name] / baseline[name]
+            better = change > 1 if higher_is_better else change < 1
+            line += f"  x{change:.2f} vs baseline ({'better' if better else 'worse'})"
+        print(line)
+    print(f"{'rows':>20}: {result['rows']}")
+    print(f"{'peak queue depths':>20}: {result.get('peak_queue_depths')}")
+    for timer in result.get("stages", {}).get("timers", []):
+        labels = ",".join(f"{key}={value}" for key, value in timer["labels"].items())
+        name = f"{timer['name']}[{labels}]" if labels else timer["name"]
+        print(f"{name:>20}: {timer['seconds']:14.3f} s in {timer['count']:,} calls")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--videos", type=int, default=60)
+    parser.add_argument("--comments", type=int, default=100)
+    parser.add_argument("--comment-pages", type=int, default=5)
+    parser.add_argument("--comments-per-page", type=int, default=20)
+    parser.add_argument("--replies", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--parse-processes", type=int, default=0)
+    parser.add_argument("--parsers", type=int)
+    parser.add_argument("--queue-size", type=int, default=16)
+    parser.add_argument("--save", help="write the result as a JSON baseline")
+    parser.add_argument("--compare", help="compare with a saved JSON baseline")
+    args = parser.parse_args()
+
+    result = run(args)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+    report(result, baseline)
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(result, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,522 @@
+"""
+Local stand-in for the parts of YouTube the crawler talks to.
+
+Serves /@channel/videos, /watch?v=, /youtubei/v1/browse and /youtubei/v1/next
+from generated fixtures shaped like the real pages, with configurable latency,
+amount of videos, comment pages and comments per page.
+
+Usage:
+    python -m benchmarks.fake_youtube [--port 8000] [--videos 60] [--latency 0.05]
+
+GET /__stats returns the request counters of the server.
+"""
+import argparse
+import json
+import threading
+import time
+
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+VIDEOS_PER_PAGE = 30
+TIME_UNITS = ("second", "minute", "hour", "day", "week", "month", "year")
+
+
+def page(
+    config: dict,
+    initial_data: dict,
+) -> str:
+    """Wraps ytcfg and ytInitialData into an HTML page the way YouTube does"""
+    return (
+        "<!DOCTYPE html><html><head>"
+        "<script>var ytcfg={d:function(){}};ytcfg.set = function(){};</script>"
+        f"<script>ytcfg.set({json.dumps(config)}); window.ytcfg.obfuscatedData_ = [];</script>"
+        '</head><body><script nonce="fake">'
+        f"var ytInitialData = {json.dumps(initial_data)};</script>"
+        '<script nonce="fake">if (window.ytcsi) {window.ytcsi.tick("pdr");}</script>'
+        "</body></html>"
+    )
+
+
+def continuation(
+    token: str,
+) -> dict:
+    return {
+        "continuationItemRenderer": {
+            "continuationEndpoint": {"continuationCommand": {"token": token}}
+        }
+    }
+
+
+class Fixtures:
+    """Generates deterministic pages of a fake channel"""
+
+    def __init__(
+        self,
+        videos: int = 60,
+        comment_pages: int = 5,
+        comments_per_page: int = 20,
+        replies: int = 3,
+        users: int = 500,
+    ) -> None:
+        self.videos = videos
+        self.comment_pages = comment_pages
+        self.comments_per_page = comments_per_page
+        self.replies = replies
+        self.users = users
+        self.config = {
+            "INNERTUBE_API_KEY": "fake-api-key",
+            "INNERTUBE_CONTEXT": {
+                "client": {"hl": "ru", "clientName": "WEB", "clientVersion": "2.0"}
+            },
+        }
+
+    def video_renderer(
+        self,
+        channel: str,
+        number: int,
+    ) -> dict:
+        video = f"{channel}-{number:06d}"
+        return {
+            "videoRenderer": {
+                "videoId": video,
+                "title": {"runs": [{"text": f"Video {number}"}]},
+                "lengthText": {"simpleText": f"{number % 60}:{number % 60:02d}"},
+                "thumbnail": {
+                    "thumbnails": [
+                        {"url": f"https://i.ytimg.com/vi/{video}/{size}.jpg"}
+                        for size in ("default", "mqdefault", "hqdefault", "sddefault")
+                    ]
+                },
+            }
+        }
+
+    def videos_page(
+        self,
+        channel: str,
+        start: int,
+    ) -> list:
+        items = [
+            self.video_renderer(channel, number)
+            for number in range(start, min(start + VIDEOS_PER_PAGE, self.videos))
+        ]
+        if start + VIDEOS_PER_PAGE < self.videos:
+            items.append(continuation(f"browse:{channel}:{start + VIDEOS_PER_PAGE}"))
+        return items
+
+    def channel(
+        self,
+        name: str,
+    ) -> str:
+        initial_data = {
+            "header": {
+                "c4TabbedHeaderRenderer": {
+                    "title": name,
+                    "subscriberCountText": {"simpleText": "1.23M subscribers"},
+                    "avatar": {
+                        "thumbnails": [
+                            {"url": f"https://yt3.ggpht.com/{name}={size}"}
+                            for size in ("s48", "s88", "s176")
+                        ]
+                    },
+                }
+            },
+            "contents": {
+                "twoColumnBrowseResultsRenderer": {
+                    "tabs": [
+                        {
+                            "tabRenderer": {
+                                "content": {
+                                    "richGridRenderer": {
+                                        "contents": self.videos_page(
+                                            name.lstrip("@"), 0
+                                        )
+                                    }
+                                }
+                            }
+                        }
+                    ]
+                }
+            },
+        }
+        return page(self.config, initial_data)
+
+    def browse(
+        self,
+        token: str,
+    ) -> dict:
+        _, channel, start = token.split(":")
+        return {
+            "onResponseReceivedActions": [
+                {
+                    "appendContinuationItemsAction": {
+                        "continuationItems": self.videos_page(channel, int(start))
+                    }
+                }
+            ]
+        }
+
+    def watch(
+        self,
+        video: str,
+    ) -> str:
+        number = int(video.rsplit("-", 1)[-1] or 0)
+        initial_data = {
+            "contents": {
+                "twoColumnWatchNextResults": {
+                    "results": {
+                        "results": {
+                            "contents": [
+                                {
+                                    "videoPrimaryInfoRenderer": {
+                                        "title": {
+                                            "runs": [{"text": f"Video {number}"}]
+                                        },
+                                        "viewCount": {
+                                            "videoViewCountRenderer": {
+                                                "viewCount": {
+                                                    "simpleText": f"{number * 1234 + 5:,} views"
+                                                }
+                                            }
+                                        },
+                                        "videoActions": {
+                                            "menuRenderer": {
+                                                "topLevelButtons": [
+                                                    {
+                                                        "segmentedLikeDislikeButtonRenderer": {
+                                                            "likeButton": {
+                                                                "toggleButtonRenderer": {
+                                                                    "defaultText": {
+                                                                        "accessibility": {
+                                                                            "accessibilityData": {
+                                                                                "label": f"{number * 17 + 3:,} likes"
+                                                                            }
+                                                                        },
+                                                                        "simpleText": "17K",
+                                                                    }
+                                                                }
+                                                            }
+                                                        }
+                                                    }
+                                                ]
+                                            }
+                                        },
+                                        "dateText": {"simpleText": "Oct 1, 2023"},
+                                    }
+                                },
+                                {
+                                    "itemSectionRenderer": {
+                                        "header": {
+                                            "commentsHeaderRenderer": {
+                                                "sortMenu": {
+                                                    "sortFilterSubMenuRenderer": {
+                                                        "subMenuItems": [
+                                                            {
+                                                                "title": "Top comments",
+                                                                "serviceEndpoint": {
+                                                                    "continuationCommand": {
+                                                                        "token": f"next:{video}:0"
+                                                                    }
+                                                                },
+                                                            },
+                                                            {
+                                                                "title": "Newest first",
+                                                                "serviceEndpoint": {
+                                                                    "continuationCommand": {
+                                                                        "token": f"next:{video}:0"
+                                                                    }
+                                                                },
+                                                            },
+                                                        ]
+                                                    }
+                                                }
+                                            }
+                                        }
+                                    }
+                                },
+                            ]
+                        }
+                    }
+                }
+            }
+        }
+        return page(self.config, initial_data)
+
+    def comment(
+        self,
+        key: str,
+        seed: int,
+        text: str,
+    ) -> dict:
+        user = seed * 7919 % self.users
+        unit = TIME_UNITS[seed % len(TIME_UNITS)]
+        amount = seed % 11 + 1
+        published = f"{amount} {unit}{'s' if amount > 1 else ''} ago"
+        if seed % 13 == 0:
+            published += " (edited)"
+
+        comment = {
+            "commentId": key,
+            "authorText": {"simpleText": f"@user{user}"},
+            "authorEndpoint": {"browseEndpoint": {"browseId": f"UC{user:022d}"}},
+            "authorThumbnail": {
+                "thumbnails": [
+                    {"url": f"https://yt3.ggpht.com/user{user}=s{size}"}
+                    for size in (48, 88, 176)
+                ]
+            },
+            "contentText": {"runs": [{"text": text}]},
+            "publishedTimeText": {"runs": [{"text": published}]},
+        }
+        if seed % 4:
+            likes = seed % 1500
+            comment["voteCount"] = {
+                "simpleText": f"{likes / 1000:.1f}K" if likes >= 1000 else str(likes)
+            }
+        return comment
+
+    def next(
+        self,
+        token: str,
+    ) -> dict:
+        kind, video, *position = token.split(":")
+        number = int(video.rsplit("-", 1)[-1] or 0)
+        page_number = int(position[0])
+
+        if kind == "reply":
+            thread = int(position[1])
+            items = [
+                {
+                    "commentRenderer": self.comment(
+                        f"{video}.{thread}.{reply}",
+                        number * 100003 + thread * 31 + reply,
+                        f"Reply {reply} to thread {thread} of video {number}",
+                    )
+                }
+                for reply in range(self.replies)
+            ]
+            return {
+                "onResponseReceivedEndpoints": [
+                    {"appendContinuationItemsAction": {"continuationItems": items}}
+                ]
+            }
+
+        items = []
+        for index in range(self.comments_per_page):
+            thread = page_number * self.comments_per_page + index
+            item = {
+                "commentThreadRenderer": {
+                    "comment": {
+                        "commentRenderer": self.comment(
+                            f"{video}.{thread}",
+                            number * 100003 + thread,
+                            f"Comment {thread} on video {number}, page {page_number}",
+                        )
+                    }
+                }
+            }
+            if self.replies and thread % 5 == 0:
+                item["commentThreadRenderer"]["replies"] = {
+                    "commentRepliesRenderer": {
+                        "contents": [
+                            continuation(f"reply:{video}:{page_number}:{thread}")
+                        ]
+                    }
+                }
+            items.append(item)
+        if page_number + 1 < self.comment_pages:
+            items.append(continuation(f"next:{video}:{page_number + 1}"))
+
+        return {
+            "onResponseReceivedEndpoints": [
+                {"reloadContinuationItemsCommand": {"continuationItems": items}}
+            ]
+        }
+
+
+class FakeYouTube:
+    """
+    HTTP server with the fake channel, every channel name serves the same fixtures.
+    Every response is delayed by `latency` seconds. With a `concurrency_limit`
+    the requests over it are answered with 429 and a Retry-After of `retry_after`.
+    """
+
+    def __init__(
+        self,
+        fixtures: Fixtures = None,
+        latency: float = 0.0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        concurrency_limit: int = None,
+        retry_after: float = 1.0,
+    ) -> None:
+        self.fixtures = fixtures or Fixtures()
+        self.latency = latency
+        self.concurrency_limit = concurrency_limit
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.requests = Counter()
+        self.bytes_sent = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self.handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(
+        self,
+    ) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def handler(
+        self,
+    ) -> type:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_GET(self) -> None:
+                url = urlparse(self.path)
+                if url.path == "/__stats":
+                    fake.send_stats(self)
+                elif url.path == "/watch":
+                    video = parse_qs(url.query).get("v", [""])[0]
+                    fake.reply(self, "watch", fake.fixtures.watch(video), "text/html")
+                elif url.path.startswith("/@") and url.path.endswith("/videos"):
+                    name = url.path.split("/")[1]
+                    fake.reply(
+                        self, "channel", fake.fixtures.channel(name), "text/html"
+                    )
+                else:
+                    fake.reply(self, "not_found", "", "text/html", 404)
+
+            def do_POST(self) -> None:
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                endpoint = urlparse(self.path).path
+                if endpoint == "/youtubei/v1/browse":
+                    response = fake.fixtures.browse(body["continuation"])
+                elif endpoint == "/youtubei/v1/next":
+                    response = fake.fixtures.next(body["continuation"])
+                else:
+                    fake.reply(self, "not_found", "", "application/json", 404)
+                    return
+                fake.reply(
+                    self,
+                    endpoint.rsplit("/", 1)[1],
+                    json.dumps(response),
+                    "application/json",
+                )
+
+            def log_message(self, *args) -> None:
+                pass
+
+        return Handler
+
+    def reply(
+        self,
+        handler: BaseHTTPRequestHandler,
+        endpoint: str,
+        body: str,
+        content_type: str,
+        status: int = 200,
+    ) -> None:
+        with self.lock:
+            self.in_flight += 1
+            throttled = (
+                self.concurrency_limit is not None
+                and self.in_flight > self.concurrency_limit
+            )
+        try:
+            if self.latency:
+                time.sleep(self.latency)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+        payload = b"" if throttled else body.encode()
+        handler.send_response(429 if throttled else status)
+        if throttled:
+            handler.send_header("Retry-After", str(self.retry_after))
+        handler.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        handler.send_header("Content-Length", str(len(payload)))
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+        with self.lock:
+            self.requests["throttled" if throttled else endpoint] += 1
+            self.bytes_sent += len(payload)
+
+    def send_stats(
+        self,
+        handler: BaseHTTPRequestHandler,
+    ) -> None:
+        """Answers with the counters of the server, they aren't counted themselves"""
+        with self.lock:
+            payload = json.dumps(
+                {"requests": self.requests, "bytes_sent": self.bytes_sent}
+            ).encode()
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(payload)))
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+    def start(
+        self,
+    ) -> "FakeYouTube":
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(
+        self,
+    ) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(
+        self,
+    ) -> "FakeYouTube":
+        return self.start()
+
+    def __exit__(
+        self,
+        *args,
+    ) -> None:
+        self.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--videos", type=int, default=60)
+    parser.add_argument("--comment-pages", type=int, default=5)
+    parser.add_argument("--comments-per-page", type=int, default=20)
+    parser.add_argument("--replies", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--concurrency-limit", type=int)
+    args = parser.parse_args()
+
+    fixtures = Fixtures(
+        videos=args.videos,
+        comment_pages=args.comment_pages,
+        comments_per_page=args.comments_per_page,
+        replies=args.replies,
+    )
+    server = FakeYouTube(
+        fixtures,
+        latency=args.latency,
+        port=args.port,
+        concurrency_limit=args.concurrency_limit,
+    )
+    print(f"Serving a fake YouTube on {server.url}", flush=True)
+    server.server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Benchmark of crawler.page_parser against the regular expressions the crawler used before.
+
+Usage:
+    python -m benchmarks.page_parser [recorded_page.html ...]
+
+Without arguments a synthetic channel page of a few megabytes is measured.
+"""
+import json
+import re
+import sys
+import timeit
+
+from crawler.page_parser import parse_page
+
+
+def parse_page_regex(
+    page: str,
+) -> tuple:
+    """The previous way of extracting (ytcfg, ytInitialData) from a page"""
+    config = json.loads(
+        re.search(r"(?<=ytcfg\.set\()(.+?)(?=\); window\.ytcfg)", page).group()
+    )
+    initial_data = json.loads(
+        re.search(
+            r'(?<=var ytInitialData \= )(.+?)(?=;\<\/script\>\<script nonce\=")',
+            page,
+        ).group()
+    )
+    return config, initial_data
+
+
+def synthetic_page(
+    videos: int = 3000,
+) -> str:
+    """Builds a page shaped like a YouTube channel page"""
+    config = {
+        "INNERTUBE_API_KEY": "key",
+        "INNERTUBE_CONTEXT": {"client": {"hl": "en", "clientName": "WEB"}},
+        "FLAGS": {f"flag_{i}": "true" for i in range(2000)},
+    }
+    initial_data = {
+        "contents": [
+            {
+                "videoRenderer": {
+                    "videoId": f"video{i}",
+                    "title": {"runs": [{"text": f'Title "{i}" {{with}} braces;</b>'}]},
+                    "lengthText": {"simpleText": "10:00"},
+                    "thumbnail": {
+                        "thumbnails": [
+                            {"url": f"https://i.ytimg.com/vi/video{i}/{size}.jpg"}
+                            for size in range(4)
+                        ]
+                    },
+                }
+            }
+            for i in range(videos)
+        ]
+    }
+    return (
+        "<html><head><script>var ytcfg={};ytcfg.set = function(){};</script>"
+        f"<script>ytcfg.set({json.dumps(config)}); window.ytcfg.obfuscatedData_ = [];</script>"
+        "</head><body>" + "<div>filler</div>" * 20000 + '<script nonce="a">'
+        f"var ytInitialData = {json.dumps(initial_data)};</script>"
+        '<script nonce="b">window.loaded = true;</script></body></html>'
+    )
+
+
+def main(
+    paths: list,
+) -> None:
+    pages = {}
+    for path in paths:
+        with open(path, encoding="utf-8") as file:
+            pages[path] = file.read()
+    if not pages:
+        pages["synthetic"] = synthetic_page()
+
+    for name, page in pages.items():
+        assert parse_page(page) == parse_page_regex(page)
+
+        number = 5
+        regex_time = timeit.timeit(lambda: parse_page_regex(page), number=number)
+        scan_time = timeit.timeit(lambda: parse_page(page), number=number)
+        print(
+            f"{name}: {len(page) / 2**20:.1f} MiB, "
+            f"regex {regex_time / number * 1000:.1f} ms, "
+            f"page_parser {scan_time / number * 1000:.1f} ms, "
+            f"x{regex_time / scan_time:.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
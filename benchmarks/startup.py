@@ -0,0 +1,73 @@
+"""
+Cold start benchmark of the headless CLI.
+
+Usage:
+    python -m benchmarks.startup [--runs 10] [--budget 0.15]
+
+Measures `python -m crawler --help` in fresh interpreters, checks that neither
+tkinter nor requests is imported at startup and exits with 1 when the median
+start time is over the budget (in seconds).
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+
+COMMAND = [sys.executable, "-m", "crawler", "--help"]
+FORBIDDEN_MODULES = ("tkinter", "requests")
+
+
+def imported_modules() -> set:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *COMMAND[1:]],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return {
+        line.rsplit("|", 1)[-1].strip()
+        for line in result.stderr.splitlines()
+        if line.startswith("import time:")
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--budget", type=float, default=0.15)
+    args = parser.parse_args()
+
+    baseline = []
+    timings = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        baseline.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        subprocess.run(COMMAND, stdout=subprocess.DEVNULL, check=True)
+        timings.append(time.perf_counter() - start)
+
+    median = statistics.median(timings)
+    print(f"bare interpreter: {statistics.median(baseline) * 1000:.1f} ms")
+    print(
+        f"python -m crawler --help: {median * 1000:.1f} ms (budget {args.budget * 1000:.0f} ms)"
+    )
+
+    modules = imported_modules()
+    heavy = [
+        name
+        for name in FORBIDDEN_MODULES
+        if any(module == name or module.startswith(f"{name}.") for module in modules)
+    ]
+    if heavy:
+        print(f"imported at startup: {', '.join(heavy)}")
+
+    if heavy or median > args.budget:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Downloading of the avatars and thumbnails referenced by the files tables.
+Images are stored in a content-addressed directory, named by the SHA-256 of
+their content, so identical images are stored once however many users or
+videos refer to them. Every URL is requested once per run, by a pool of
+threads, and files downloaded before are requested conditionally with their
+ETag and Last-Modified, so unchanged images are not transferred again.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import requests
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from crawler.db import Database, FILE_TABLES
+from crawler.throttle import RateLimiter, ThrottledAdapter
+
+
+class AssetDownloader:
+    """
+    Class for downloading the images of the files tables into `directory`.
+    `workers` threads download the images, each with its own keep-alive
+    session, and a `limiter` throttles their requests. Results are written by
+    the calling thread in transactions of up to `batch_size` URLs.
+    """
+
+    extensions = {
+        "image/jpeg": ".jpg",
+        "image/png": ".png",
+        "image/webp": ".webp",
+        "image/gif": ".gif",
+    }
+
+    def __init__(
+        self,
+        directory: str,
+        workers: int = 8,
+        limiter: RateLimiter = None,
+        batch_size: int = 100,
+        timeout: float = 30.0,
+    ) -> None:
+        self.directory = os.path.abspath(directory)
+        self.workers = max(1, workers)
+        self.limiter = limiter
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.local = threading.local()
+
+    @property
+    def session(
+        self,
+    ) -> requests.Session:
+        """Session of the current thread, its connections are kept alive between images"""
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = requests.session()
+            if self.limiter is not None:
+                adapter = ThrottledAdapter(self.limiter)
+            else:
+                adapter = HTTPAdapter()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            self.local.session = session
+        return session
+
+    def store(
+        self,
+        content: bytes,
+        content_type: str,
+    ) -> tuple:
+        """Stores an image under its hash unless it is there already, returns (path, hash)"""
+        digest = hashlib.sha256(content).hexdigest()
+        extension = self.extensions.get(content_type.split(";")[0].strip(), "")
+        folder = os.path.join(self.directory, digest[:2])
+        path = os.path.join(folder, digest + extension)
+
+        if not os.path.exists(path):
+            os.makedirs(folder, exist_ok=True)
+            # Written under a temporary name, so a file with the name is complete
+            descriptor, temporary = tempfile.mkstemp(dir=folder)
+            with os.fdopen(descriptor, "wb") as file:
+                file.write(content)
+            os.replace(temporary, path)
+
+        return path, digest
+
+    def fetch(
+        self,
+        url: str,
+        etag: str = None,
+        last_modified: str = None,
+    ) -> tuple:
+        """
+        Downloads an image, returns (local_path, size, hash, etag, last_modified)
+        or None if it is unchanged since the given `etag` or `last_modified`.
+        """
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+
+        content = response.content
+        path, digest = self.store(content, response.headers.get("Content-Type", ""))
+        return (
+            path,
+            len(content),
+            digest,
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+        )
+
+    def download(
+        self,
+        db: Database,
+        refresh: bool = False,
+        tables: tuple = FILE_TABLES,
+    ) -> dict:
+        """
+        Function for downloading the files of `tables` that have no local copy,
+        or all of them with `refresh`. Returns the number of URLs downloaded,
+        unchanged and failed, and of the distinct files the downloads are stored as.
+        """
+        # Rows of all the tables with the same URL share one request, it is
+        # conditional only when all of them still have their downloaded copy
+        urls = {}
+        for table in tables:
+            for file_id, url, local_path, etag, last_modified in db.get_file_queue(
+                table, refresh
+            ):
+                entry = urls.setdefault(url, [[], etag, last_modified])
+                entry[0].append((table, file_id))
+                if local_path is None or not os.path.exists(local_path):
+                    entry[1] = entry[2] = None
+
+        stats = {"downloaded": 0, "unchanged": 0, "failed": 0, "files": 0}
+        stored = set()
+        updates = {table: [] for table in tables}
+
+        # The files stored so far are recorded even if the run is interrupted
+        try:
+            with ThreadPoolExecutor(self.workers) as pool:
+                futures = {
+                    pool.submit(self.fetch, url, etag, last_modified): rows
+                    for url, (rows, etag, last_modified) in urls.items()
+                }
+                for number, future in enumerate(as_completed(futures), start=1):
+                    try:
+                        result = future.result()
+                    except (requests.RequestException, OSError):
+                        # Network errors and errors storing the file, e.g. a full disk
+                        stats["failed"] += 1
+                        continue
+
+                    if result is None:
+                        stats["unchanged"] += 1
+                    else:
+                        stats["downloaded"] += 1
+                        stored.add(result[0])
+                        for table, file_id in futures[future]:
+                            updates[table].append((*result, file_id))
+
+                    if number % self.batch_size == 0:
+                        self.save(db, updates)
+        finally:
+            self.save(db, updates)
+
+        stats["files"] = len(stored)
+        return stats
+
+    def save(
+        self,
+        db: Database,
+        updates: dict,
+    ) -> None:
+        with db.transaction():
+            for table, rows in updates.items():
+                db.save_files(table, rows)
+                rows.clear()
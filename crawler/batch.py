@@ -0,0 +1,134 @@
+import traceback
+
+from typing import Callable
+from concurrent.futures import Executor, ThreadPoolExecutor, as_completed
+from crawler.cache import ResponseCache
+from crawler.crawler import YouTubeCrawler
+from crawler.metrics import CrawlStats
+from crawler.profiling import CrawlProfiler
+from crawler.throttle import AdaptiveConcurrency, RateLimiter
+
+
+class BatchCrawler:
+    """
+    Class for crawling a list of channels.
+    All channels share one pool of `max_concurrency` workers and one RateLimiter:
+    requests are limited to `rate` per second and the number of requests in flight
+    follows AIMD, halving on 429/5xx responses and growing while latency stays
+    under `target_latency`. `channel_workers` channels are listed and written
+    to the database at the same time, each of them can fetch with all the workers.
+    A `parser` executor, e.g. a ProcessPoolExecutor, parses the responses of all
+    the channels with `parsers` parsing threads per channel.
+    All the crawlers record their metrics in one `stats`, dumped to the
+    `metrics` file as every channel finishes. The batch is profiled
+    as a whole by its `profiler`, or the one switched on by the environment,
+    see crawler.profiling: it is started and stopped by run() and only counts
+    the videos of the crawlers.
+    """
+
+    def __init__(
+        self,
+        channels: list,
+        rate: float = 10.0,
+        max_concurrency: int = 32,
+        target_latency: float = 2.0,
+        channel_workers: int = 2,
+        cache: ResponseCache = None,
+        base_url: str = "https://www.youtube.com",
+        parser: Executor = None,
+        parsers: int = 1,
+        comment_order: str = "threads",
+        stats: CrawlStats = None,
+        profiler: CrawlProfiler = None,
+        metrics: str = None,
+    ) -> None:
+        self.channels = channels
+        self.max_concurrency = max_concurrency
+        self.channel_workers = max(1, channel_workers)
+        self.cache = cache
+        self.base_url = base_url
+        self.parser = parser
+        self.parsers = parsers
+        self.comment_order = comment_order
+        self.stats = stats or CrawlStats()
+        self.profiler = profiler
+        self.metrics = metrics
+        self.limiter = RateLimiter(
+            rate,
+            concurrency=AdaptiveConcurrency(
+                initial=min(4, max_concurrency),
+                maximum=max_concurrency,
+                target_latency=target_latency,
+            ),
+        )
+
+    def run(
+        self,
+        progress_callback: Callable[[str, float], None],
+        video_amount: int = 10,
+        comment_amount: int = 1000,
+        path: str = "youtube.db",
+        resume: bool = False,
+    ) -> dict:
+        """
+        Crawls every channel, a failed channel doesn't stop the others.
+        Returns a dict from channel name to None or the traceback of its failure.
+        """
+        profiler = self.profiler or CrawlProfiler.from_environment(path)
+        started = profiler is not None and profiler.start()
+        try:
+            return self.crawl(
+                progress_callback, video_amount, comment_amount, path, resume, profiler
+            )
+        finally:
+            if started:
+                profiler.stop()
+
+    def crawl(
+        self,
+        progress_callback: Callable[[str, float], None],
+        video_amount: int,
+        comment_amount: int,
+        path: str,
+        resume: bool,
+        profiler: CrawlProfiler,
+    ) -> dict:
+        results = {}
+
+        with ThreadPoolExecutor(
+            max_workers=self.max_concurrency
+        ) as executor, ThreadPoolExecutor(
+            max_workers=self.channel_workers
+        ) as channel_executor:
+            futures = {
+                channel_executor.submit(
+                    YouTubeCrawler(
+                        name,
+                        workers=self.max_concurrency,
+                        cache=self.cache,
+                        base_url=self.base_url,
+                        limiter=self.limiter,
+                        executor=executor,
+                        parser=self.parser,
+                        stats=self.stats,
+                        profiler=profiler,
+                        metrics=self.metrics,
+                        parsers=self.parsers,
+                        comment_order=self.comment_order,
+                    ).load_channel,
+                    lambda progress, name=name: progress_callback(name, progress),
+                    video_amount,
+                    comment_amount,
+                    path,
+                    resume,
+                ): name
+                for name in self.channels
+            }
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                    results[futures[future]] = None
+                except Exception:
+                    results[futures[future]] = traceback.format_exc()
+
+        return results
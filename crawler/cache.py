@@ -0,0 +1,237 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from collections import OrderedDict
+from requests import Response
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+
+class CacheMiss(ConnectionError):
+    """Raised in replay mode for a request that is not in the cache"""
+
+
+class ResponseCache:
+    """
+    On-disk cache of HTTP responses.
+    Entries are keyed by the method, the URL with its query and the hash of the
+    request body, and are stored as files named by that key.
+    Entries older than `ttl` seconds are fetched again, the least recently used
+    ones are evicted once the cache grows over `max_size` bytes.
+    In `replay` mode responses are served only from the cache, regardless of their age.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        ttl: float = None,
+        max_size: int = 2**30,
+        replay: bool = False,
+    ) -> None:
+        self.directory = directory
+        self.ttl = ttl
+        self.max_size = max_size
+        self.replay = replay
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.size = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self.load_index()
+
+    def load_index(
+        self,
+    ) -> None:
+        """Builds the LRU order of the entries from their modification time"""
+        entries = []
+        for subdirectory in os.scandir(self.directory):
+            if not subdirectory.is_dir():
+                continue
+            for entry in os.scandir(subdirectory.path):
+                if entry.is_file() and not entry.name.endswith(".tmp"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.name, stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self.entries[key] = size
+            self.size += size
+
+    @staticmethod
+    def key(
+        method: str,
+        url: str,
+        body: bytes = None,
+    ) -> str:
+        if isinstance(body, str):
+            body = body.encode()
+        body_hash = hashlib.sha256(body or b"").hexdigest()
+        return hashlib.sha256(f"{method} {url} {body_hash}".encode()).hexdigest()
+
+    def path(
+        self,
+        key: str,
+    ) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(
+        self,
+        key: str,
+    ) -> tuple:
+        """Returns the (metadata, body) of a fresh entry or None"""
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+
+        path = self.path(key)
+        try:
+            with open(path, "rb") as file:
+                metadata = json.loads(file.readline())
+                body = file.read()
+            os.utime(path)
+        except (OSError, ValueError):
+            self.discard(key)
+            return None
+
+        if (
+            not self.replay
+            and self.ttl is not None
+            and time.time() - metadata["created"] > self.ttl
+        ):
+            return None
+
+        return metadata, body
+
+    def put(
+        self,
+        key: str,
+        url: str,
+        status: int,
+        headers: dict,
+        body: bytes,
+    ) -> None:
+        metadata = {
+            "url": url,
+            "status": status,
+            "headers": headers,
+            "created": time.time(),
+        }
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        temporary = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary, "wb") as file:
+            file.write(json.dumps(metadata).encode() + b"\n")
+            file.write(body)
+        os.replace(temporary, path)
+        size = os.path.getsize(path)
+
+        with self.lock:
+            self.size += size - self.entries.pop(key, 0)
+            self.entries[key] = size
+            self.evict()
+
+    def discard(
+        self,
+        key: str,
+    ) -> None:
+        with self.lock:
+            self.size -= self.entries.pop(key, 0)
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+
+    def evict(
+        self,
+    ) -> None:
+        """Removes the least recently used entries, must be called under the lock"""
+        while self.size > self.max_size and len(self.entries) > 1:
+            key, size = self.entries.popitem(last=False)
+            self.size -= size
+            try:
+                os.remove(self.path(key))
+            except OSError:
+                pass
+
+
+class CacheAdapter(HTTPAdapter):
+    """
+    Transport adapter that serves requests of a session from a ResponseCache.
+    Cache misses are sent with `adapter` when it is given, e.g. a ThrottledAdapter.
+    """
+
+    cached_headers = ("Content-Type",)
+
+    def __init__(
+        self,
+        cache: ResponseCache,
+        adapter: HTTPAdapter = None,
+        **kwargs,
+    ) -> None:
+        super().__init__(**kwargs)
+        self.cache = cache
+        self.adapter = adapter
+
+    def send(
+        self,
+        request,
+        **kwargs,
+    ) -> Response:
+        key = self.cache.key(request.method, request.url, request.body)
+
+        entry = self.cache.get(key)
+        if entry is not None:
+            return self.build_cached_response(request, *entry)
+        if self.cache.replay:
+            raise CacheMiss(
+                f"{request.method} {request.url} is not cached", request=request
+            )
+
+        if self.adapter is not None:
+            response = self.adapter.send(request, **kwargs)
+        else:
+            response = super().send(request, **kwargs)
+        if response.status_code == 200:
+            self.cache.put(
+                key,
+                request.url,
+                response.status_code,
+                {
+                    header: response.headers[header]
+                    for header in self.cached_headers
+                    if header in response.headers
+                },
+                response.content,
+            )
+
+        return response
+
+    def close(
+        self,
+    ) -> None:
+        super().close()
+        if self.adapter is not None:
+            self.adapter.close()
+
+    def build_cached_response(
+        self,
+        request,
+        metadata: dict,
+        body: bytes,
+    ) -> Response:
+        response = Response()
+        response.status_code = metadata["status"]
+        response.reason = "OK"
+        response.headers = CaseInsensitiveDict(metadata["headers"])
+        response.encoding = get_encoding_from_headers(response.headers) or "utf-8"
+        response.url = request.url
+        response.request = request
+        response._content = body
+
+        return response
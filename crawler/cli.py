@@ -0,0 +1,494 @@
+"""
+Headless command line interface of the crawler, run it with `python -m crawler`.
+
+Only argparse, sqlite3 and the standard library are imported at startup,
+the crawler itself (and requests with it) is imported by the commands that
+crawl. tkinter is never imported.
+"""
+import argparse
+import sqlite3
+import sys
+
+
+def connect_read_only(
+    path: str,
+) -> sqlite3.Connection:
+    from crawler.db import read_only_uri
+
+    return sqlite3.connect(read_only_uri(path), uri=True)
+
+
+def print_progress(
+    channel: str,
+    progress: float,
+) -> None:
+    print(f"\r{channel}: {progress:5.1f}%", end="", file=sys.stderr, flush=True)
+    if progress >= 100:
+        print(file=sys.stderr)
+
+
+def crawl(
+    args: argparse.Namespace,
+    resume: bool = False,
+) -> int:
+    from contextlib import nullcontext
+    from crawler.cache import ResponseCache
+
+    cache = None
+    if args.cache:
+        cache = ResponseCache(
+            args.cache,
+            ttl=args.cache_ttl or None,
+            max_size=args.cache_size * 2**20,
+            replay=args.replay,
+        )
+
+    if args.parse_processes:
+        from concurrent.futures import ProcessPoolExecutor
+
+        pool = ProcessPoolExecutor(args.parse_processes)
+    else:
+        pool = nullcontext()
+
+    from crawler.metrics import CrawlStats
+    from crawler.profiling import CrawlProfiler
+
+    stats = CrawlStats()
+    if args.profile or args.trace_memory:
+        profiler = CrawlProfiler.for_database(args.db, args.trace_memory)
+    else:
+        profiler = CrawlProfiler.from_environment(args.db)
+
+    # The whole run is profiled here, so that a batch of channels is one profile
+    started = profiler is not None and profiler.start()
+    try:
+        with pool as parser:
+            status = run_crawl(args, resume, cache, parser, stats, profiler)
+    finally:
+        if started:
+            profiler.stop()
+            print(f"Profile written to {profiler.prefix}.*", file=sys.stderr)
+    print(stats.summary(), file=sys.stderr)
+
+    if args.assets is not None:
+        args.dir = args.assets or None
+        args.refresh = False
+        status = max(status, assets(args))
+    return status
+
+
+def run_crawl(
+    args: argparse.Namespace,
+    resume: bool,
+    cache,
+    parser,
+    stats,
+    profiler,
+) -> int:
+    if len(args.channels) == 1 and args.rate is None:
+        from crawler.crawler import YouTubeCrawler
+
+        name = args.channels[0]
+        YouTubeCrawler(
+            name,
+            workers=args.workers,
+            cache=cache,
+            base_url=args.base_url,
+            parser=parser,
+            parsers=args.parsers or max(1, args.parse_processes),
+            queue_size=args.queue_size,
+            comment_order=args.comment_order,
+            stats=stats,
+            profiler=profiler,
+            metrics=args.metrics,
+        ).load_channel(
+            lambda progress: print_progress(name, progress),
+            video_amount=args.videos,
+            comment_amount=args.comments,
+            path=args.db,
+            resume=resume,
+        )
+        return 0
+
+    from crawler.batch import BatchCrawler
+
+    failures = {
+        channel: error
+        for channel, error in BatchCrawler(
+            args.channels,
+            rate=args.rate or 10.0,
+            max_concurrency=args.workers,
+            cache=cache,
+            base_url=args.base_url,
+            parser=parser,
+            parsers=args.parsers or max(1, args.parse_processes),
+            comment_order=args.comment_order,
+            stats=stats,
+            profiler=profiler,
+            metrics=args.metrics,
+        )
+        .run(
+            print_progress,
+            video_amount=args.videos,
+            comment_amount=args.comments,
+            path=args.db,
+            resume=resume,
+        )
+        .items()
+        if error is not None
+    }
+    for channel, error in failures.items():
+        print(f"{channel} failed:\n{error}", file=sys.stderr)
+
+    return 1 if failures else 0
+
+
+def export(
+    args: argparse.Namespace,
+) -> int:
+    connection = connect_read_only(args.db)
+    tables = {
+        row[0]
+        for row in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type='table'"
+        )
+    }
+    if args.table not in tables:
+        print(f"No such table: {args.table}", file=sys.stderr)
+        return 1
+
+    cursor = connection.execute(f'SELECT * FROM "{args.table}"')
+    columns = [column[0] for column in cursor.description]
+    output = open(args.output, "w", newline="") if args.output else sys.stdout
+
+    try:
+        if args.format == "csv":
+            import csv
+
+            writer = csv.writer(output)
+            writer.writerow(columns)
+            while rows := cursor.fetchmany(1000):
+                writer.writerows(rows)
+        else:
+            import json
+
+            while rows := cursor.fetchmany(1000):
+                for row in rows:
+                    output.write(
+                        json.dumps(dict(zip(columns, row)), ensure_ascii=False)
+                    )
+                    output.write("\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        connection.close()
+
+    return 0
+
+
+def query(
+    args: argparse.Namespace,
+) -> int:
+    connection = connect_read_only(args.db)
+    try:
+        cursor = connection.execute(args.sql)
+    except sqlite3.Error as error:
+        print(error, file=sys.stderr)
+        return 1
+
+    if cursor.description:
+        print("\t".join(column[0] for column in cursor.description))
+    while rows := cursor.fetchmany(1000):
+        for row in rows:
+            print("\t".join("" if value is None else str(value) for value in row))
+    connection.close()
+
+    return 0
+
+
+def search(
+    args: argparse.Namespace,
+) -> int:
+    from crawler.search import search_comments
+
+    connection = connect_read_only(args.db)
+    try:
+        rows = search_comments(connection, args.text, args.limit)
+    except sqlite3.Error as error:
+        print(error, file=sys.stderr)
+        return 1
+    finally:
+        connection.close()
+
+    for comment_id, user_name, snippet in rows:
+        print(f"{comment_id}\t{user_name}\t{snippet}")
+
+    return 0
+
+
+def assets(
+    args: argparse.Namespace,
+) -> int:
+    import os
+    from crawler.assets import AssetDownloader
+    from crawler.db import Database
+
+    directory = args.dir or os.path.join(
+        os.path.dirname(os.path.abspath(args.db)), "assets"
+    )
+    limiter = None
+    if args.rate is not None:
+        from crawler.throttle import RateLimiter
+
+        limiter = RateLimiter(args.rate)
+
+    db = Database(args.db)
+    try:
+        db.initialize()
+        stats = AssetDownloader(directory, args.workers, limiter).download(
+            db, refresh=args.refresh
+        )
+    finally:
+        db.conn_close()
+
+    print(
+        "downloaded {downloaded}, unchanged {unchanged}, failed {failed}, "
+        "stored as {files} files".format(**stats),
+        file=sys.stderr,
+    )
+    return 1 if stats["failed"] else 0
+
+
+def users(
+    args: argparse.Namespace,
+) -> int:
+    from crawler.user_stats import top_users, users_with_comments
+
+    connection = connect_read_only(args.db)
+    try:
+        if args.min is not None:
+            rows = users_with_comments(connection, args.min, args.limit or -1)
+        else:
+            rows = top_users(connection, args.by, args.limit or 10)
+    except sqlite3.Error as error:
+        print(error, file=sys.stderr)
+        return 1
+    finally:
+        connection.close()
+
+    for row in rows:
+        print("\t".join("" if value is None else str(value) for value in row))
+
+    return 0
+
+
+def rebuild_counters(
+    args: argparse.Namespace,
+) -> int:
+    from crawler.db import Database
+
+    db = Database(args.db)
+    try:
+        db.initialize()
+        db.rebuild_user_stats()
+    finally:
+        db.conn_close()
+
+    return 0
+
+
+def index(
+    args: argparse.Namespace,
+) -> int:
+    from crawler.db import Database
+
+    db = Database(args.db)
+    try:
+        db.initialize()
+        db.rebuild_search_index()
+    finally:
+        db.conn_close()
+
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m crawler",
+        description="YouTube crawler without the GUI",
+    )
+    parser.add_argument("--db", default="youtube.db", help="path of the database")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    for name, help in (
+        ("crawl", "crawl channels"),
+        ("resume", "resume interrupted crawls of channels"),
+    ):
+        command = commands.add_parser(name, help=help)
+        command.add_argument("channels", nargs="+", help="channel names, e.g. @MrBeast")
+        command.add_argument("--videos", type=int, default=10)
+        command.add_argument("--comments", type=int, default=1000)
+        command.add_argument("--workers", type=int, default=4)
+        command.add_argument(
+            "--rate",
+            type=float,
+            help="requests per second shared by all the channels",
+        )
+        command.add_argument("--cache", help="directory of the response cache")
+        command.add_argument(
+            "--cache-ttl",
+            type=float,
+            default=86400.0,
+            metavar="SECONDS",
+            help="fetch cached responses again after this many seconds, a day by default, 0 keeps them forever",
+        )
+        command.add_argument(
+            "--cache-size",
+            type=int,
+            default=1024,
+            metavar="MB",
+            help="evict the least recently used responses over this size",
+        )
+        command.add_argument(
+            "--replay",
+            action="store_true",
+            help="serve all requests from the cache",
+        )
+        command.add_argument(
+            "--parse-processes",
+            type=int,
+            default=0,
+            help="parse responses in this many worker processes",
+        )
+        command.add_argument(
+            "--parsers",
+            type=int,
+            help="parsing threads, as many as --parse-processes by default",
+        )
+        command.add_argument(
+            "--queue-size",
+            type=int,
+            default=16,
+            help="pages waiting in front of the parsers and the writer",
+        )
+        command.add_argument(
+            "--comment-order",
+            choices=("threads", "replies", "fifo"),
+            default="threads",
+            help="top-level comments first, replies first or in the found order",
+        )
+        command.add_argument(
+            "--metrics",
+            metavar="FILE",
+            help="write the metrics of the crawl, in the Prometheus format to a .prom file and as JSON otherwise",
+        )
+        command.add_argument(
+            "--profile",
+            action="store_true",
+            help="profile the crawl with cProfile, the dumps are written next to the database",
+        )
+        command.add_argument(
+            "--trace-memory",
+            type=int,
+            default=0,
+            metavar="VIDEOS",
+            help="take a tracemalloc snapshot every this many videos",
+        )
+        command.add_argument(
+            "--assets",
+            nargs="?",
+            const="",
+            metavar="DIR",
+            help="download the images afterwards, see the assets command",
+        )
+        command.add_argument(
+            "--base-url",
+            default="https://www.youtube.com",
+            help="address of YouTube, e.g. of benchmarks.fake_youtube",
+        )
+
+    command = commands.add_parser("export", help="export a table")
+    command.add_argument("table")
+    command.add_argument("--format", choices=("csv", "jsonl"), default="csv")
+    command.add_argument("--output", "-o", help="file to write, stdout by default")
+
+    command = commands.add_parser("query", help="run an SQL query")
+    command.add_argument("sql")
+
+    command = commands.add_parser(
+        "search",
+        help='full-text search of comments: words, "phrases" and prefix*',
+    )
+    command.add_argument("text")
+    command.add_argument("--limit", type=int, default=100)
+
+    command = commands.add_parser(
+        "assets",
+        help="download the avatars and thumbnails of the crawled data",
+    )
+    command.add_argument(
+        "--dir",
+        help="directory of the images, assets next to the database by default",
+    )
+    command.add_argument("--workers", type=int, default=8)
+    command.add_argument("--rate", type=float, help="requests per second")
+    command.add_argument(
+        "--refresh",
+        action="store_true",
+        help="check the downloaded images for changes too",
+    )
+
+    command = commands.add_parser(
+        "users",
+        help="top users by their comment counters",
+    )
+    command.add_argument(
+        "--by",
+        choices=("comments", "likes", "recent"),
+        default="comments",
+    )
+    command.add_argument(
+        "--min",
+        type=int,
+        help="all the users with at least this many comments instead",
+    )
+    command.add_argument("--limit", type=int, help="10 top users by default")
+
+    commands.add_parser(
+        "rebuild-counters",
+        help="recount the comment counters of the users",
+    )
+
+    commands.add_parser(
+        "index",
+        help="rebuild the full-text index of the comments",
+    )
+
+    return parser
+
+
+def main(
+    argv: list = None,
+) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, "replay", False) and not args.cache:
+        parser.error("--replay requires --cache")
+
+    if args.command == "crawl":
+        return crawl(args)
+    if args.command == "resume":
+        return crawl(args, resume=True)
+    if args.command == "export":
+        return export(args)
+    if args.command == "search":
+        return search(args)
+    if args.command == "index":
+        return index(args)
+    if args.command == "assets":
+        return assets(args)
+    if args.command == "users":
+        return users(args)
+    if args.command == "rebuild-counters":
+        return rebuild_counters(args)
+    return query(args)
@@ -1,12 +1,21 @@
 import requests
-import re
-import json
+import threading
+import time
 
 from typing import Callable
-from math import ceil
-from crawler.extractors import VideoExtractor, ChannelExtractor, CommentExtractor
-from crawler.db import Database
-from crawler.find_keys import find_keys
+from concurrent.futures import Executor
+from crawler.cache import ResponseCache, CacheAdapter
+from crawler.db import Database, connections
+from crawler.frontier import CommentFrontier
+from crawler.metrics import CrawlStats
+from crawler.profiling import CrawlProfiler
+from crawler.parse_worker import (
+    parse_channel_page,
+    parse_videos_page,
+    timed,
+)
+from crawler.pipeline import CrawlPipeline, VideoTask
+from crawler.throttle import RateLimiter, ThrottledAdapter
 
 
 class YouTubeCrawler:
@@ -14,14 +23,115 @@ class YouTubeCrawler:
     Class for extracting important data from a channel.
     You need to pass the YouTube channel id to the class.
     For example: YouTubeCrawler("@MrBeast")
+    Videos are crawled by the staged pipeline of crawler.pipeline: `workers`
+    fetching threads (running in a shared `executor` when it is given) and
+    `parsers` parsing threads connected by queues of at most `queue_size` pages,
+    with a single writer. A `limiter` throttles all the requests.
+    Responses are parsed by the `parser` executor when it is given, e.g. a
+    ProcessPoolExecutor, with one job per parsing thread.
+    Comment continuations are requested in `comment_order`, see
+    crawler.frontier.CommentFrontier.
+    With a `cache` responses are stored on disk and, in its replay mode,
+    served without touching the network.
+    The crawl state is checkpointed in the database, so that an interrupted
+    crawl can be resumed with load_channel(..., resume=True).
+    The timers and counters of all the stages are collected in `stats`, a
+    crawler.metrics.CrawlStats that can be shared by several crawlers, and
+    dumped to the `metrics` file at the end of every run of load_channel.
+    A `profiler` from crawler.profiling profiles the runs of load_channel.
     """
 
-    def __init__(self, name: str) -> None:
-        self.session = requests.session()
-        self.session.headers[
-            "User-Agent"
-        ] = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0.5845.2296 YaBrowser/23.9.0.2296 Yowser/2.5 Safari/537.36"
+    user_agent = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0.5845.2296 YaBrowser/23.9.0.2296 Yowser/2.5 Safari/537.36"
+
+    def __init__(
+        self,
+        name: str,
+        workers: int = 4,
+        cache: ResponseCache = None,
+        base_url: str = "https://www.youtube.com",
+        limiter: RateLimiter = None,
+        executor: Executor = None,
+        parser: Executor = None,
+        parsers: int = 1,
+        queue_size: int = 16,
+        comment_order: str = "threads",
+        stats: CrawlStats = None,
+        profiler: CrawlProfiler = None,
+        metrics: str = None,
+    ) -> None:
         self.name = name
+        self.base_url = base_url
+        self.workers = max(1, workers)
+        self.cache = cache
+        self.limiter = limiter
+        self.executor = executor
+        self.parser = parser
+        self.parsers = max(1, parsers)
+        self.queue_size = queue_size
+        self.comment_order = comment_order
+        self.pipeline = None
+        self.stats = stats or CrawlStats()
+        self.profiler = profiler
+        self.metrics = metrics
+        self.local = threading.local()
+
+    @property
+    def session(
+        self,
+    ) -> requests.Session:
+        """Session of the current thread, requests.Session is not shared between workers"""
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = requests.session()
+            session.headers["User-Agent"] = self.user_agent
+
+            adapter = None
+            if self.limiter is not None:
+                adapter = ThrottledAdapter(self.limiter)
+            if self.cache is not None:
+                adapter = CacheAdapter(self.cache, adapter)
+            if adapter is not None:
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+            self.local.session = session
+        return session
+
+    def parse(
+        self,
+        function: Callable,
+        *args,
+    ) -> tuple:
+        """Runs a function of crawler.parse_worker in the parser executor or in place"""
+        if self.parser is None:
+            result, timings = timed(function, *args)
+        else:
+            result, timings = self.parser.submit(timed, function, *args).result()
+
+        for step, seconds in timings.items():
+            self.stats.add_time("parse", seconds, step=step)
+        return result
+
+    def request(
+        self,
+        method: str,
+        endpoint: str,
+        url: str,
+        **kwargs,
+    ) -> bytes:
+        """
+        Sends a request with the session of the current thread and returns the
+        response body. Its latency, including the wait for the limiter, and its
+        size are recorded per endpoint.
+        """
+        start = time.perf_counter()
+        response = self.session.request(method, url, **kwargs)
+        content = response.content
+        self.stats.add_time("http", time.perf_counter() - start, endpoint=endpoint)
+        self.stats.count("http_bytes", len(content), endpoint=endpoint)
+        if not response.ok:
+            self.stats.count("http_errors", endpoint=endpoint)
+        response.raise_for_status()
+        return content
 
     def load_channel(
         self,
@@ -29,87 +139,166 @@ class YouTubeCrawler:
         video_amount: int = 10,
         comment_amount: int = 1000,
         path: str = "youtube.db",
+        resume: bool = False,
     ) -> None:
         """
         Function for collecting data about the channel and its videos.
         It should transmit the number of videos that need to be parsed and the number of
         comments that need to be collected under each video.
+        Videos are fetched and parsed by the stages of a CrawlPipeline, while all
+        database writes and progress updates happen in the calling thread, through
+        the single writer connection of crawler.db.connections(path).
+        With `resume` the completed videos of the previous crawl are skipped and the
+        started ones continue from their saved continuation tokens.
+        The run is profiled by the `profiler` of the crawler, or the one switched on
+        by the environment, see crawler.profiling, unless a profiler is running
+        already, e.g. the one of a BatchCrawler, which then only counts its videos.
+        At the end, even of a failed run, the stats are dumped to the `metrics` file
+        of the crawler or the one of the environment, see crawler.metrics.
         """
-        db = Database(path)
+        profiler = self.profiler or CrawlProfiler.from_environment(path)
+        started = profiler is not None and profiler.start()
+        try:
+            self.crawl_channel(
+                progress_callback,
+                video_amount,
+                comment_amount,
+                path,
+                resume,
+                profiler,
+            )
+        finally:
+            if started:
+                profiler.stop()
+            metrics = CrawlStats.destination(self.metrics)
+            if metrics is not None:
+                self.stats.dump(metrics)
+
+    def crawl_channel(
+        self,
+        progress_callback: Callable[[int], None],
+        video_amount: int,
+        comment_amount: int,
+        path: str,
+        resume: bool,
+        profiler: CrawlProfiler = None,
+    ) -> None:
+        db = connections(path).writer()
+        db.stats = self.stats
         db.initialize()
 
-        response = self.session.get(f"https://www.youtube.com/{self.name}/videos").text
+        body = self.request("GET", "channel", f"{self.base_url}/{self.name}/videos")
 
-        data = []
-        data.append(
-            json.loads(
-                re.search(
-                    "(?<=ytcfg\.set\()(.+?)(?=\); window\.ytcfg)", response
-                ).group()
-            )
+        config, channel_data, videos, cursor = self.parse(
+            parse_channel_page, body, self.name
         )
-        data.append(
-            json.loads(
-                re.search(
-                    '(?<=var ytInitialData \= )(.+?)(?=;\<\/script\>\<script nonce\=")',
-                    response,
-                ).group()
+
+        with db.transaction():
+            channel_id = db.add_channel(
+                channel_data["channel_name"],
+                channel_data["channel_amount_followers"],
+                channel_data["channel_link"],
+                channel_data["channel_follower_count"],
             )
-        )
+            db.add_channel_files(
+                "image",
+                channel_data["channel_avatar"],
+                channel_id,
+            )
+            if not resume:
+                db.reset_checkpoint(channel_id)
 
-        data[0]["INNERTUBE_CONTEXT"]["client"]["hl"] = "en"
+        queue = self.list_videos(db, channel_id, config, videos, cursor, video_amount)
 
-        channel_extractor = ChannelExtractor(data[1])
-        channel_data = channel_extractor.channel_extract(self.name)
-        channel_id = db.add_channel(
-            channel_data["channel_name"],
-            channel_data["channel_amount_followers"],
-            channel_data["channel_link"],
-        )
-        db.add_channel_files(
-            "image",
-            channel_data["channel_avatar"],
-            channel_id,
-        )
+        progress = 0
+        precent = 100 / max(len(queue), 1)
 
-        videos = find_keys(data[1], "videoRenderer")
-        videos_ldv = [
-            [
-                video["videoId"],
-                video["lengthText"]["simpleText"],
-                video["thumbnail"]["thumbnails"][3]["url"],
-            ]
-            for video in videos
-        ]
-
-        for _ in range(ceil(video_amount / 30) - 1):
-            self.video_pagination(data)
-
-            videos = find_keys(data[1], "videoRenderer")
-            videos_ldv += [
-                [
-                    video["videoId"],
-                    video["lengthText"]["simpleText"],
-                    video["thumbnail"]["thumbnails"][3]["url"],
-                ]
-                for video in videos
-            ]
+        tasks = []
+        for key, duration, preview, status, video_id, comment_count, tokens in queue:
+            if status == "done":
+                progress += precent
+                continue
+            frontier = None
+            if tokens is not None:
+                frontier = CommentFrontier.from_state(tokens, self.comment_order)
+            tasks.append(
+                VideoTask(key, duration, preview, video_id, comment_count, frontier)
+            )
+        progress_callback(progress)
 
-        progress = 0
-        precent = 100 / video_amount
+        def video_done() -> None:
+            nonlocal progress
+            progress += precent
+            self.stats.count("videos")
+            progress_callback(progress)
+            if profiler is not None:
+                profiler.video_done()
 
         # Collecting videos data and their comments
-        for i in range(video_amount):
-            self.load_video(
-                data,
-                videos_ldv[i][0],
-            )
+        self.pipeline = CrawlPipeline(
+            self,
+            config,
+            comment_amount,
+            fetchers=self.workers,
+            parsers=self.parsers,
+            queue_size=self.queue_size,
+            executor=self.executor,
+            comment_order=self.comment_order,
+        )
+        try:
+            self.pipeline.run(db, channel_id, tasks, video_done)
+        finally:
+            db.conn_close()
+        progress_callback(100)
 
-            video_extractor = VideoExtractor(data[1])
-            video_data = video_extractor.video_extract(
-                videos_ldv[i][0],
-                videos_ldv[i][1],
-            )
+    def queue_depths(
+        self,
+    ) -> dict:
+        """Numbers of items waiting in front of every stage of the current crawl"""
+        if self.pipeline is None:
+            return {}
+        return self.pipeline.depths()
+
+    def list_videos(
+        self,
+        db: Database,
+        channel_id: int,
+        config: dict,
+        videos: list,
+        cursor: str,
+        video_amount: int,
+    ) -> list:
+        """
+        Function for building the queue of videos to crawl.
+        Every page of the video list is checkpointed together with the cursor of the
+        next one, a resumed crawl continues the list from that cursor.
+        """
+        started, saved_cursor = db.get_video_cursor(channel_id)
+        if started:
+            cursor = saved_cursor
+        else:
+            with db.transaction():
+                db.add_video_queue(channel_id, videos, cursor)
+
+        queue = db.get_video_queue(channel_id)
+        while len(queue) < video_amount and cursor is not None:
+            videos, cursor = self.video_pagination(config, cursor)
+            with db.transaction():
+                db.add_video_queue(channel_id, videos, cursor)
+            queue = db.get_video_queue(channel_id)
+
+        return queue[:video_amount]
+
+    def save_video(
+        self,
+        db: Database,
+        channel_id: int,
+        key: str,
+        video_data: dict,
+        preview: str,
+    ) -> int:
+        """Function for writing a crawled video and its checkpoint in one transaction"""
+        with db.transaction():
             video_id = db.add_video(
                 video_data["video_name"],
                 video_data["video_link"],
@@ -118,116 +307,129 @@ class YouTubeCrawler:
                 video_data["video_date"],
                 video_data["video_duration"],
                 channel_id,
+                video_data["video_view_count"],
+                video_data["video_like_count"],
             )
             db.add_video_files(
                 "image",
-                videos_ldv[i][2],
+                preview,
                 video_id,
             )
+            db.save_video_checkpoint(key, "started", video_id)
 
-            self.comment_pagination(
-                data,
-                comment_amount,
-                db,
-                video_id,
-            )
-            progress += precent
-            progress_callback(progress)
-        progress_callback(100)
-        db.conn_close()
+        return video_id
 
-    def comment_pagination(
+    def save_comment_page(
         self,
-        data: list,
-        comment_amount: int,
         db: Database,
-        video_id: str,
+        key: str,
+        video_id: int,
+        comments: list,
+        comment_count: int,
+        tokens: dict,
     ) -> None:
-        """Function for pagination of comments on videos."""
-        comment_cnt = 0
-        tokens = [find_keys(data[1], "subMenuItems")[0][0]["serviceEndpoint"]]
-
-        while comment_amount > comment_cnt and tokens:
-            token = tokens.pop()
+        """
+        Function for writing a page of comments together with the checkpoint of
+        its video, i.e. the number of comments and the state of its frontier after it.
+        """
+        with db.transaction():
+            self.save_comments(db, video_id, comments)
+            db.save_video_checkpoint(key, "started", video_id, comment_count, tokens)
 
-            params = {
-                "key": data[0]["INNERTUBE_API_KEY"],
-            }
+    def finish_video(
+        self,
+        db: Database,
+        key: str,
+        video_id: int,
+        comment_count: int,
+    ) -> None:
+        """Function for marking a video as done in the checkpoint, with its final number of comments"""
+        with db.transaction():
+            db.save_video_checkpoint(key, "done", video_id, comment_count)
 
-            json_data = {
-                "context": data[0]["INNERTUBE_CONTEXT"],
-                "continuation": token["continuationCommand"]["token"],
-            }
+    def save_comments(
+        self,
+        db: Database,
+        video_id: int,
+        comments: list,
+    ) -> None:
+        """
+        Function for writing a page of users, comments and avatars in one transaction.
+        Users are resolved through the user id cache of the database.
+        """
+        comment_rows = []
+        avatar_rows = []
 
-            response = self.session.post(
-                "https://www.youtube.com/youtubei/v1/next",
-                params=params,
-                json=json_data,
-            ).json()
+        with db.transaction():
+            for comment in comments:
+                user_id, known = db.resolve_user(comment.user_name, comment.user_link)
+                comment_rows.append(
+                    (
+                        comment.comment_text,
+                        comment.comment_date,
+                        comment.comment_likes,
+                        user_id,
+                        video_id,
+                        comment.comment_key,
+                        comment.comment_like_count,
+                    )
+                )
+                # The avatar of a known user has been stored with the user
+                if not known and comment.user_avatar != "":
+                    avatar_rows.append(("image", comment.user_avatar, user_id))
 
-            data[1] = response
-            [
-                tokens.insert(0, tkn)
-                for tkn in find_keys(data[1], "continuationEndpoint")
-            ]
+            db.add_comments(comment_rows)
+            db.add_user_files_many(avatar_rows)
 
-            comments = find_keys(data[1], "commentRenderer")
+    def fetch_comments(
+        self,
+        config: dict,
+        token: str,
+    ) -> bytes:
+        """Function for loading a page of comments on a video by its continuation token"""
+        params = {
+            "key": config["INNERTUBE_API_KEY"],
+        }
 
-            for comment in comments:
-                comment_extractor = CommentExtractor(comment)
-                comment_data = comment_extractor.comment_extract()
+        json_data = {
+            "context": config["INNERTUBE_CONTEXT"],
+            "continuation": token,
+        }
 
-                user_id = db.add_user(
-                    comment_data["user_name"],
-                    comment_data["user_link"],
-                )
-                db.add_comment(
-                    comment_data["comment_text"],
-                    comment_data["comment_date"],
-                    comment_data["comment_likes"],
-                    user_id,
-                    video_id,
-                )
-                if comment_data["user_avatar"] != "":
-                    db.add_user_files(
-                        "image",
-                        comment_data["user_avatar"],
-                        user_id,
-                    )
-            comment_cnt += len(comments)
+        return self.request(
+            "POST",
+            "next",
+            f"{self.base_url}/youtubei/v1/next",
+            params=params,
+            json=json_data,
+        )
 
     def video_pagination(
         self,
-        data: list,
-    ) -> None:
-        """Function for pagination of videos on channel"""
+        config: dict,
+        cursor: str,
+    ) -> tuple:
+        """Function for pagination of videos on channel, returns the videos and the next cursor"""
         params = {
-            "key": data[0]["INNERTUBE_API_KEY"],
+            "key": config["INNERTUBE_API_KEY"],
         }
         json_data = {
-            "context": data[0]["INNERTUBE_CONTEXT"],
-            "continuation": find_keys(data[1], "continuationEndpoint")[0][
-                "continuationCommand"
-            ]["token"],
+            "context": config["INNERTUBE_CONTEXT"],
+            "continuation": cursor,
         }
 
-        response = self.session.post(
-            "https://www.youtube.com/youtubei/v1/browse",
+        body = self.request(
+            "POST",
+            "browse",
+            f"{self.base_url}/youtubei/v1/browse",
             params=params,
             json=json_data,
-        ).json()
-        data[1] = response
+        )
+        return self.parse(parse_videos_page, body)
 
-    def load_video(
+    def fetch_video(
         self,
-        data: list,
         link: str,
-    ) -> None:
-        """Function for collecting video data"""
-        response = self.session.get(f"https://www.youtube.com/watch?v={link}").text
-        data[1] = json.loads(
-            re.search(
-                '(?<=var ytInitialData \= )(.+?)(?=;\<\/script\>\<script nonce\=")',
-                response,
-            ).group()
-        )
+    ) -> bytes:
+        """Function for loading the watch page of a video"""
+        return self.request("GET", "watch", f"{self.base_url}/watch?v={link}")
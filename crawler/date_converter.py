@@ -1,34 +1,63 @@
-from datetime import datetime, timedelta
+import re
+
+from datetime import date, datetime, timezone
+
+
+# "3 days ago", "1 year ago (edited)", "Streamed 2 weeks ago"
+TIME_AGO = re.compile(
+    r"(\d+)\s+(second|minute|hour|day|week|month|year)s?\b", re.IGNORECASE
+)
+
+UNIT_SECONDS = {
+    "second": 1,
+    "minute": 60,
+    "hour": 60 * 60,
+    "day": 24 * 60 * 60,
+    "week": 7 * 24 * 60 * 60,
+    "month": 30 * 24 * 60 * 60,
+    "year": 365 * 24 * 60 * 60,
+}
+
+
+class DateConverter:
+    """
+    Class for converting relative dates such as "3 days ago" into absolute ones.
+    All dates are counted from one `reference` time (now by default), so the
+    dates of a crawl don't drift while it runs. There are few distinct relative
+    dates, so every one of them is converted once and then looked up in a table.
+    """
+
+    def __init__(
+        self,
+        reference: datetime = None,
+    ) -> None:
+        self.reference = reference or datetime.now(timezone.utc)
+        self.epoch = int(self.reference.timestamp())
+        self.table = {}
+
+    def convert(
+        self,
+        time_ago: str,
+    ) -> tuple:
+        """Returns the (epoch seconds, ISO date) of a relative date in UTC"""
+        result = self.table.get(time_ago)
+        if result is None:
+            match = TIME_AGO.search(time_ago)
+            if match is None:
+                raise ValueError(f"Unknown relative date: {time_ago}")
+
+            value, unit = match.groups()
+            timestamp = self.epoch - int(value) * UNIT_SECONDS[unit.lower()]
+            result = (
+                timestamp,
+                datetime.fromtimestamp(timestamp, timezone.utc).date().isoformat(),
+            )
+            self.table[time_ago] = result
+
+        return result
 
 
 def parse_time_ago(
     time_ago: str,
-) -> str:
-    words = time_ago.split()
-
-    value = int(words[0])
-    unit = words[1].lower()
-
-    if unit == "years" or unit == "year":
-        delta = timedelta(days=365 * value)
-    elif unit == "months" or unit == "month":
-        delta = timedelta(days=30 * value)
-    elif unit == "weeks" or unit == "week":
-        delta = timedelta(weeks=value)
-    elif unit == "days" or unit == "day":
-        delta = timedelta(days=value)
-    elif unit == "hours" or unit == "hour":
-        delta = timedelta(hours=value)
-    elif unit == "minutes" or unit == "minute":
-        delta = timedelta(minutes=value)
-    elif unit == "seconds" or unit == "second":
-        delta = timedelta(minutes=value)
-    else:
-        raise ValueError
-
-    current_time = datetime.now()
-    result_date = current_time - delta
-
-    result_date = result_date.date()
-
-    return result_date
+) -> date:
+    return date.fromisoformat(DateConverter().convert(time_ago)[1])
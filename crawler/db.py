@@ -1,20 +1,467 @@
+import json
+import os
+import pathlib
+import queue
 import sqlite3
+import threading
+import time
 
-from crawler.date_converter import parse_time_ago
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator
+from datetime import datetime
+from crawler.date_converter import DateConverter
+from crawler.number_parser import parse_count
+
+
+def deduplicate(
+    table: str,
+    id_column: str,
+    key_column: str,
+    references: list,
+) -> str:
+    """
+    Builds a script that keeps the first row of every `key_column` value in `table`
+    and points the (table, column) `references` of the removed rows to it.
+    Rows without a key are all kept, NULL is distinct in a unique index too.
+    """
+    keep = f"SELECT MIN({id_column}) FROM {table} GROUP BY {key_column}"
+    removed = (
+        f"SELECT {id_column} FROM {table} "
+        f"WHERE {key_column} IS NOT NULL AND {id_column} NOT IN ({keep})"
+    )
+    script = ""
+    for ref_table, ref_column in references:
+        script += f"""
+            UPDATE {ref_table} SET {ref_column} = (
+                SELECT MIN(duplicate.{id_column})
+                FROM {table} AS duplicate
+                JOIN {table} AS original ON original.{key_column} = duplicate.{key_column}
+                WHERE original.{id_column} = {ref_table}.{ref_column}
+            )
+            WHERE {ref_column} IN ({removed});
+            """
+    script += f"""
+            DELETE FROM {table} WHERE {id_column} IN ({removed});
+            """
+    return script
+
+
+def split_statements(
+    script: str,
+) -> Iterator[str]:
+    """Splits an SQL script into statements, one statement per line at most"""
+    statement = ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            yield statement.strip()
+            statement = ""
+
+
+# Tables of the images referenced by the crawl, file_path is the URL of an image
+# and file_local_path its downloaded copy
+FILE_TABLES = ("user_files", "video_files", "channel_files")
+
+# Recounts user_stats from the comments, every user gets a row
+USER_STATS_REBUILD = """
+            DELETE FROM user_stats;
+            INSERT INTO user_stats (user_id, comment_count, last_comment_date, total_likes)
+            SELECT user_id, COUNT(*), MAX(comment_date), COALESCE(SUM(comment_like_count), 0)
+            FROM comments WHERE user_id IS NOT NULL GROUP BY user_id;
+            INSERT OR IGNORE INTO user_stats (user_id) SELECT user_id FROM users;
+            """
+
+# Schema changes applied to existing databases, PRAGMA user_version holds the
+# number of migrations already applied.
+MIGRATIONS = [
+    deduplicate(
+        "channels",
+        "channel_id",
+        "channel_name",
+        [("videos", "channel_id"), ("channel_files", "channel_id")],
+    )
+    + deduplicate(
+        "videos",
+        "video_id",
+        "video_link",
+        [("comments", "video_id"), ("video_files", "video_id")],
+    )
+    # Authors without a channel are different users, not one with the link ""
+    + """
+            UPDATE users SET user_link = NULL WHERE user_link = '';
+            """
+    + deduplicate(
+        "users",
+        "user_id",
+        "user_link",
+        [("comments", "user_id"), ("user_files", "user_id")],
+    )
+    + deduplicate("user_files", "file_id", "user_id", [])
+    + deduplicate("video_files", "file_id", "video_id", [])
+    + deduplicate("channel_files", "file_id", "channel_id", [])
+    + """
+            CREATE UNIQUE INDEX IF NOT EXISTS channels_channel_name ON channels(channel_name);
+            CREATE UNIQUE INDEX IF NOT EXISTS videos_video_link ON videos(video_link);
+            CREATE UNIQUE INDEX IF NOT EXISTS users_user_link ON users(user_link);
+            CREATE UNIQUE INDEX IF NOT EXISTS user_files_user_id ON user_files(user_id);
+            CREATE UNIQUE INDEX IF NOT EXISTS video_files_video_id ON video_files(video_id);
+            CREATE UNIQUE INDEX IF NOT EXISTS channel_files_channel_id ON channel_files(channel_id);
+            """,
+    """
+            ALTER TABLE comments ADD COLUMN comment_key VARCHAR;
+            CREATE UNIQUE INDEX IF NOT EXISTS comments_comment_key ON comments(comment_key);
+
+            CREATE TABLE IF NOT EXISTS crawl_channels (
+                channel_id INTEGER PRIMARY KEY REFERENCES channels(channel_id),
+                video_cursor VARCHAR
+            );
+
+            CREATE TABLE IF NOT EXISTS crawl_videos (
+                video_key VARCHAR PRIMARY KEY,
+                channel_id INT REFERENCES channels(channel_id),
+                position INT,
+                video_duration VARCHAR,
+                video_preview VARCHAR,
+                status VARCHAR DEFAULT 'queued',
+                video_id INT REFERENCES videos(video_id),
+                comment_count INT DEFAULT 0,
+                comment_tokens VARCHAR
+            );
+            CREATE INDEX IF NOT EXISTS crawl_videos_channel_id ON crawl_videos(channel_id, position);
+            """,
+    """
+            ALTER TABLE channels ADD COLUMN channel_follower_count INTEGER;
+            ALTER TABLE videos ADD COLUMN video_view_count INTEGER;
+            ALTER TABLE videos ADD COLUMN video_like_count INTEGER;
+            ALTER TABLE comments ADD COLUMN comment_like_count INTEGER;
+
+            UPDATE channels SET channel_follower_count = parse_count(channel_amount_followers);
+            UPDATE videos SET video_view_count = parse_count(video_views), video_like_count = parse_count(video_likes);
+            UPDATE comments SET comment_like_count = parse_count(comment_likes);
+
+            CREATE INDEX IF NOT EXISTS videos_video_view_count ON videos(video_view_count);
+            CREATE INDEX IF NOT EXISTS videos_video_like_count ON videos(video_like_count);
+            CREATE INDEX IF NOT EXISTS comments_comment_like_count ON comments(comment_like_count);
+            """,
+    """
+            ALTER TABLE comments ADD COLUMN comment_timestamp INTEGER;
+            UPDATE comments SET comment_timestamp = CAST(strftime('%s', comment_date) AS INTEGER);
+            CREATE INDEX IF NOT EXISTS comments_comment_date ON comments(comment_date);
+            """,
+    """
+            CREATE VIRTUAL TABLE IF NOT EXISTS comments_fts USING fts5(comment_text, content='comments', content_rowid='comment_id', tokenize='unicode61 remove_diacritics 2', prefix='2 3');
+
+            CREATE TRIGGER IF NOT EXISTS comments_fts_insert AFTER INSERT ON comments BEGIN
+                INSERT INTO comments_fts (rowid, comment_text) VALUES (new.comment_id, new.comment_text);
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS comments_fts_delete AFTER DELETE ON comments BEGIN
+                INSERT INTO comments_fts (comments_fts, rowid, comment_text) VALUES ('delete', old.comment_id, old.comment_text);
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS comments_fts_update AFTER UPDATE OF comment_text ON comments BEGIN
+                INSERT INTO comments_fts (comments_fts, rowid, comment_text) VALUES ('delete', old.comment_id, old.comment_text);
+                INSERT INTO comments_fts (rowid, comment_text) VALUES (new.comment_id, new.comment_text);
+            END;
+
+            INSERT INTO comments_fts (comments_fts) VALUES ('rebuild');
+            """,
+    """
+            CREATE TABLE IF NOT EXISTS user_stats (
+                user_id INTEGER PRIMARY KEY REFERENCES users(user_id),
+                comment_count INTEGER NOT NULL DEFAULT 0,
+                last_comment_date VARCHAR,
+                total_likes INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS user_stats_comment_count ON user_stats(comment_count);
+            CREATE INDEX IF NOT EXISTS user_stats_total_likes ON user_stats(total_likes);
+            CREATE INDEX IF NOT EXISTS user_stats_last_comment_date ON user_stats(last_comment_date);
+
+            CREATE TRIGGER IF NOT EXISTS user_stats_user AFTER INSERT ON users BEGIN
+                INSERT OR IGNORE INTO user_stats (user_id) VALUES (new.user_id);
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS user_stats_insert AFTER INSERT ON comments WHEN new.user_id IS NOT NULL BEGIN
+                INSERT INTO user_stats (user_id, comment_count, last_comment_date, total_likes) VALUES (new.user_id, 1, new.comment_date, COALESCE(new.comment_like_count, 0))
+                ON CONFLICT (user_id) DO UPDATE SET comment_count = comment_count + 1, total_likes = total_likes + excluded.total_likes, last_comment_date = CASE WHEN last_comment_date >= excluded.last_comment_date THEN last_comment_date ELSE COALESCE(excluded.last_comment_date, last_comment_date) END;
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS user_stats_delete AFTER DELETE ON comments WHEN old.user_id IS NOT NULL BEGIN
+                UPDATE user_stats SET comment_count = comment_count - 1, total_likes = total_likes - COALESCE(old.comment_like_count, 0), last_comment_date = CASE WHEN old.comment_date < last_comment_date THEN last_comment_date ELSE (SELECT MAX(comment_date) FROM comments WHERE user_id = old.user_id) END WHERE user_id = old.user_id;
+            END;
+
+            CREATE TRIGGER IF NOT EXISTS user_stats_update AFTER UPDATE OF user_id, comment_date, comment_like_count ON comments BEGIN
+                UPDATE user_stats SET comment_count = comment_count - 1, total_likes = total_likes - COALESCE(old.comment_like_count, 0), last_comment_date = CASE WHEN old.comment_date < last_comment_date THEN last_comment_date ELSE (SELECT MAX(comment_date) FROM comments WHERE user_id = old.user_id AND comment_id != new.comment_id) END WHERE user_id = old.user_id;
+                INSERT INTO user_stats (user_id, comment_count, last_comment_date, total_likes) SELECT new.user_id, 1, new.comment_date, COALESCE(new.comment_like_count, 0) WHERE new.user_id IS NOT NULL
+                ON CONFLICT (user_id) DO UPDATE SET comment_count = comment_count + 1, total_likes = total_likes + excluded.total_likes, last_comment_date = CASE WHEN last_comment_date >= excluded.last_comment_date THEN last_comment_date ELSE COALESCE(excluded.last_comment_date, last_comment_date) END;
+            END;
+            """
+    + USER_STATS_REBUILD,
+    "".join(
+        f"""
+            ALTER TABLE {table} ADD COLUMN file_local_path VARCHAR;
+            ALTER TABLE {table} ADD COLUMN file_size INTEGER;
+            ALTER TABLE {table} ADD COLUMN file_hash VARCHAR;
+            ALTER TABLE {table} ADD COLUMN file_etag VARCHAR;
+            ALTER TABLE {table} ADD COLUMN file_last_modified VARCHAR;
+            """
+        for table in FILE_TABLES
+    ),
+    """
+            UPDATE users SET user_link = NULL WHERE user_link = '';
+            """,
+]
+
+# Pragmas of every connection: WAL lets readers work while the crawler writes,
+# and with WAL synchronous=NORMAL is still safe against corruption, it only
+# syncs at checkpoints. cache_size is negative KiB, i.e. 64 MiB of page cache.
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -65536",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA busy_timeout = 5000",
+)
+
+READ_ONLY_PRAGMAS = (
+    "PRAGMA cache_size = -16384",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA busy_timeout = 5000",
+)
+
+
+def read_only_uri(
+    path: str,
+) -> str:
+    """
+    URI opening the database at `path` read-only, with the path escaped, so that
+    names with "?", "#" or "%" and relative Windows paths open the right file.
+    """
+    return pathlib.Path(path).resolve().as_uri() + "?mode=ro"
+
+
+def connect(
+    path: str,
+    read_only: bool = False,
+) -> sqlite3.Connection:
+    """
+    Opens a connection with the tuned PRAGMAS, it can be used by any thread.
+    Read-only connections can't change the database, not even by mistake.
+    """
+    if read_only:
+        connection = sqlite3.connect(
+            read_only_uri(path), uri=True, check_same_thread=False
+        )
+    else:
+        connection = sqlite3.connect(path, check_same_thread=False)
+    connection.create_function("parse_count", 1, parse_count, deterministic=True)
+
+    for pragma in READ_ONLY_PRAGMAS if read_only else PRAGMAS:
+        connection.execute(pragma)
+    return connection
+
+
+class ConnectionManager:
+    """
+    Class for sharing the connections to one database inside the process.
+    There is a single writer connection, used by all the Database objects from
+    writer(), whose transactions take turns, and a pool of at most `readers`
+    read-only connections, e.g. for the tabs of the GUI.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        readers: int = 4,
+    ) -> None:
+        self.path = path
+        self.readers = max(1, readers)
+        self.lock = threading.Lock()
+        self.write_lock = threading.RLock()
+        self.connection = None
+        self.pool = queue.LifoQueue()
+        self.opened = 0
+
+    def write_connection(
+        self,
+    ) -> sqlite3.Connection:
+        with self.lock:
+            if self.connection is None:
+                self.connection = connect(self.path)
+            return self.connection
+
+    def writer(
+        self,
+        reference: datetime = None,
+    ) -> "Database":
+        """A Database writing through the shared writer connection"""
+        return Database(self.path, reference, manager=self)
+
+    def acquire(
+        self,
+    ) -> sqlite3.Connection:
+        """Takes a read-only connection, waits while all of them are in use"""
+        # The writer creates the database and switches it to WAL first
+        self.write_connection()
+        with self.lock:
+            if self.pool.empty() and self.opened < self.readers:
+                self.opened += 1
+                return connect(self.path, read_only=True)
+        return self.pool.get()
+
+    def release(
+        self,
+        connection: sqlite3.Connection,
+    ) -> None:
+        if connection.in_transaction:
+            connection.rollback()
+        self.pool.put(connection)
+
+    @contextmanager
+    def reader(
+        self,
+    ) -> Iterator[sqlite3.Connection]:
+        connection = self.acquire()
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+    def close(
+        self,
+    ) -> None:
+        """Closes the idle connections, the ones in use are closed by their owners"""
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+            while not self.pool.empty():
+                self.pool.get().close()
+                self.opened -= 1
+
+
+managers = {}
+managers_lock = threading.Lock()
+
+
+def connections(
+    path: str,
+    readers: int = 4,
+) -> ConnectionManager:
+    """Returns the ConnectionManager of a database path, shared by the whole process"""
+    key = os.path.abspath(path)
+    with managers_lock:
+        if key not in managers:
+            managers[key] = ConnectionManager(path, readers)
+        return managers[key]
 
 
 class Database:
-    """SQL database for youtube channels"""
+    """
+    SQL database for youtube channels.
+    Counts are stored both as display strings and as integers, the parse_count
+    SQL function converts display strings in queries and migrations.
+    Relative comment dates are stored as an ISO date and epoch seconds, both
+    counted from the `reference` time of the DateConverter of the database.
+    With a `manager` the database uses its shared writer connection; several
+    threads can then write through it, but only inside transaction().
+    The ids of the last `user_cache_size` users are kept in memory, see resolve_user().
+    With `stats`, a crawler.metrics.CrawlStats, the time of the writes and the
+    rows written are recorded per table.
+    """
 
     def __init__(
         self,
         path: str,
+        reference: datetime = None,
+        manager: ConnectionManager = None,
+        user_cache_size: int = 65536,
     ) -> None:
-        self.conn = sqlite3.connect(path)
+        self.dates = DateConverter(reference)
+        self.user_ids = OrderedDict()
+        self.new_user_ids = {}
+        self.user_cache_size = user_cache_size
+        self.stats = None
+        self.manager = manager
+        if manager is None:
+            self.conn = connect(path)
+            self.lock = threading.RLock()
+        else:
+            self.conn = manager.write_connection()
+            self.lock = manager.write_lock
         self.cursor = self.conn.cursor()
+        self.transaction_depth = 0
+
+    @contextmanager
+    def transaction(
+        self,
+    ) -> Iterator["Database"]:
+        """
+        Context manager that groups writes into a single transaction.
+        The add_* methods called inside it don't commit, everything is committed
+        once on exit or rolled back if an exception is raised.
+        The outermost transaction holds the lock of the writer connection.
+        """
+        if not self.transaction_depth:
+            self.lock.acquire()
+        self.transaction_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self.transaction_depth -= 1
+            if not self.transaction_depth:
+                self.conn.rollback()
+                self.new_user_ids.clear()
+                self.lock.release()
+            raise
+        else:
+            self.transaction_depth -= 1
+            if self.transaction_depth:
+                return
+            # A failed COMMIT must not keep the writer locked, and the users
+            # it didn't write must not get into the cache
+            try:
+                self.commit()
+            except BaseException:
+                self.conn.rollback()
+                raise
+            else:
+                self.remember_users()
+            finally:
+                self.new_user_ids.clear()
+                self.lock.release()
+
+    def commit(
+        self,
+    ) -> None:
+        """Commits the changes unless a transaction is open"""
+        if not self.transaction_depth:
+            start = time.perf_counter()
+            self.conn.commit()
+            if self.stats is not None:
+                self.stats.add_time("commit", time.perf_counter() - start)
+
+    def record(
+        self,
+        table: str,
+        rows: int,
+        start: float,
+    ) -> None:
+        """Records the SQL time since `start` and the rows written to a table"""
+        if self.stats is not None:
+            self.stats.add_time("sql", time.perf_counter() - start, table=table)
+            self.stats.count("rows", rows, table=table)
 
     def initialize(
         self,
+    ) -> None:
+        with self.lock:
+            self.create_tables()
+            self.migrate()
+
+    def create_tables(
+        self,
     ) -> None:
         self.cursor.executescript(
             """
@@ -75,30 +522,85 @@ class Database:
         )
         self.conn.commit()
 
+    def migrate(
+        self,
+    ) -> None:
+        """
+        Applies the MIGRATIONS the database doesn't have yet.
+        They run in one immediate transaction, so that connections opened at the
+        same time don't apply a migration twice.
+        """
+        version = self.cursor.execute("PRAGMA user_version").fetchone()[0]
+        if version >= len(MIGRATIONS):
+            return
+
+        self.conn.commit()
+        self.cursor.execute("BEGIN IMMEDIATE")
+        try:
+            version = self.cursor.execute("PRAGMA user_version").fetchone()[0]
+            for number, script in enumerate(MIGRATIONS[version:], start=version + 1):
+                for statement in split_statements(script):
+                    self.cursor.execute(statement)
+                self.cursor.execute(f"PRAGMA user_version = {number}")
+        except BaseException:
+            self.conn.rollback()
+            raise
+        self.conn.commit()
+
+    def rebuild_search_index(
+        self,
+    ) -> None:
+        """
+        Rebuilds the comments_fts full-text index from the comments table.
+        The migration adding the index fills it and triggers keep it in sync,
+        so this is only a repair, e.g. after the comments were changed with the
+        triggers dropped.
+        """
+        self.cursor.execute(
+            "INSERT INTO comments_fts (comments_fts) VALUES ('rebuild')"
+        )
+        self.cursor.execute(
+            "INSERT INTO comments_fts (comments_fts) VALUES ('optimize')"
+        )
+        self.commit()
+
+    def rebuild_user_stats(
+        self,
+    ) -> None:
+        """
+        Recounts the user_stats counters from the comments.
+        Triggers on comments and users keep them up to date, a rebuild is only
+        needed after the tables were changed with the triggers dropped.
+        """
+        for statement in split_statements(USER_STATS_REBUILD):
+            self.cursor.execute(statement)
+        self.commit()
+
     def add_channel(
         self,
         name: str,
         amount_followers: str,
         link: str,
-    ) -> str:
+        follower_count: int = None,
+    ) -> int:
+        start = time.perf_counter()
         self.cursor.execute(
             """
-            INSERT INTO channels (channel_name, channel_amount_followers, channel_link)
-            SELECT ?, ?, ?
-            WHERE NOT EXISTS (
-                SELECT 1
-                FROM channels
-                WHERE channel_name = ?
-            );
+            INSERT INTO channels (channel_name, channel_amount_followers, channel_link, channel_follower_count)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (channel_name) DO UPDATE SET
+                channel_amount_followers = excluded.channel_amount_followers,
+                channel_link = excluded.channel_link,
+                channel_follower_count = excluded.channel_follower_count
+            RETURNING channel_id;
             """,
-            (name, amount_followers, link, name),
+            (name, amount_followers, link, follower_count),
         )
-        self.conn.commit()
-
-        self.cursor.execute("SELECT MAX(channel_id) FROM channels")
-        last_id = self.cursor.fetchone()[0]
+        channel_id = self.cursor.fetchone()[0]
+        self.record("channels", 1, start)
+        self.commit()
 
-        return last_id
+        return channel_id
 
     def add_video(
         self,
@@ -109,25 +611,42 @@ class Database:
         date: str,
         duration: str,
         channel_id: int,
-    ) -> str:
+        view_count: int = None,
+        like_count: int = None,
+    ) -> int:
+        start = time.perf_counter()
         self.cursor.execute(
             """
-            INSERT INTO videos (video_name, video_link, video_views, video_likes, video_date, video_duration, channel_id)
-            SELECT ?, ?, ?, ?, ?, ?, ?
-            WHERE NOT EXISTS (
-                SELECT 1
-                FROM videos
-                WHERE video_link = ?
-            );
+            INSERT INTO videos (video_name, video_link, video_views, video_likes, video_date, video_duration, channel_id, video_view_count, video_like_count)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (video_link) DO UPDATE SET
+                video_name = excluded.video_name,
+                video_views = excluded.video_views,
+                video_likes = excluded.video_likes,
+                video_date = excluded.video_date,
+                video_duration = excluded.video_duration,
+                channel_id = excluded.channel_id,
+                video_view_count = excluded.video_view_count,
+                video_like_count = excluded.video_like_count
+            RETURNING video_id;
             """,
-            (name, link, views, likes, date, duration, channel_id, link),
+            (
+                name,
+                link,
+                views,
+                likes,
+                date,
+                duration,
+                channel_id,
+                view_count,
+                like_count,
+            ),
         )
-        self.conn.commit()
-
-        self.cursor.execute("SELECT MAX(video_id) FROM videos")
-        last_id = self.cursor.fetchone()[0]
+        video_id = self.cursor.fetchone()[0]
+        self.record("videos", 1, start)
+        self.commit()
 
-        return last_id
+        return video_id
 
     def add_comment(
         self,
@@ -136,38 +655,119 @@ class Database:
         likes: str,
         user_id: str,
         video_id: int,
+        key: str = None,
+        like_count: int = None,
     ) -> None:
+        start = time.perf_counter()
+        timestamp, iso_date = self.dates.convert(date)
         self.cursor.execute(
             """
-            INSERT INTO comments (comment_text, comment_date, comment_likes, user_id, video_id) VALUES(?, ?, ?, ?, ?);
+            INSERT INTO comments (comment_text, comment_date, comment_likes, user_id, video_id, comment_key, comment_like_count, comment_timestamp) VALUES(?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (comment_key) DO NOTHING;
             """,
-            (text, parse_time_ago(date), likes, user_id, video_id),
+            (
+                text,
+                iso_date,
+                likes,
+                user_id,
+                video_id,
+                key,
+                like_count,
+                timestamp,
+            ),
         )
-        self.conn.commit()
+        self.record("comments", 1, start)
+        self.commit()
+
+    def add_comments(
+        self,
+        rows: list,
+    ) -> None:
+        """
+        Inserts (text, date, likes, user_id, video_id, key, like_count) rows with
+        a single executemany
+        """
+        start = time.perf_counter()
+        comment_rows = []
+        for text, date, likes, user_id, video_id, key, like_count in rows:
+            timestamp, iso_date = self.dates.convert(date)
+            comment_rows.append(
+                (text, iso_date, likes, user_id, video_id, key, like_count, timestamp)
+            )
+
+        self.cursor.executemany(
+            """
+            INSERT INTO comments (comment_text, comment_date, comment_likes, user_id, video_id, comment_key, comment_like_count, comment_timestamp) VALUES(?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (comment_key) DO NOTHING;
+            """,
+            comment_rows,
+        )
+        self.record("comments", len(comment_rows), start)
+        self.commit()
 
     def add_user(
         self,
         name: str,
         link: str,
-    ) -> str:
+    ) -> int:
+        """Adds or renames the user with the `link`, a user without a link is always new"""
+        start = time.perf_counter()
         self.cursor.execute(
             """
             INSERT INTO users (user_name, user_link)
-            SELECT ?, ?
-            WHERE NOT EXISTS (
-                SELECT 1
-                FROM users
-                WHERE user_name = ?
-            )
+            VALUES (?, ?)
+            ON CONFLICT (user_link) DO UPDATE SET
+                user_name = excluded.user_name
+            RETURNING user_id;
             """,
-            (name, link, name),
+            (name, link or None),
         )
-        self.conn.commit()
+        user_id = self.cursor.fetchone()[0]
+        self.record("users", 1, start)
+        self.commit()
+
+        return user_id
+
+    def resolve_user(
+        self,
+        name: str,
+        link: str,
+    ) -> tuple:
+        """
+        add_user through an LRU cache of user ids by their link, the browseId of
+        the user's channel. Returns (user_id, known), a known user whose name
+        hasn't changed costs no SQL at all. Users added inside a transaction are
+        cached once it is committed, so rolled back ids are never reused.
+        Users without a link can't be told apart, they are added every time.
+        """
+        if not link:
+            return self.add_user(name, None), False
 
-        self.cursor.execute("SELECT MAX(user_id) FROM users")
-        last_id = self.cursor.fetchone()[0]
+        user = self.new_user_ids.get(link)
+        if user is None:
+            user = self.user_ids.get(link)
+            if user is not None:
+                self.user_ids.move_to_end(link)
+        if user is not None and user[1] == name:
+            return user[0], True
 
-        return last_id
+        user_id = self.add_user(name, link)
+        self.new_user_ids[link] = (user_id, name)
+        if not self.transaction_depth:
+            self.remember_users()
+
+        return user_id, False
+
+    def remember_users(
+        self,
+    ) -> None:
+        """Moves the committed users into the LRU cache, evicting the oldest ones"""
+        for link, user in self.new_user_ids.items():
+            self.user_ids[link] = user
+            self.user_ids.move_to_end(link)
+        self.new_user_ids.clear()
+        while len(self.user_ids) > self.user_cache_size:
+            self.user_ids.popitem(last=False)
 
     def add_user_files(
         self,
@@ -175,19 +775,34 @@ class Database:
         path: str,
         user_id: int,
     ) -> None:
+        start = time.perf_counter()
         self.cursor.execute(
             """
             INSERT INTO user_files (file_type, file_path, user_id)
-            SELECT ?, ?, ?
-            WHERE NOT EXISTS (
-                SELECT 1
-                FROM user_files
-                WHERE user_id = ?
-            )
+            VALUES (?, ?, ?)
+            ON CONFLICT (user_id) DO NOTHING
             """,
-            (type, path, user_id, user_id),
+            (type, path, user_id),
         )
-        self.conn.commit()
+        self.record("user_files", 1, start)
+        self.commit()
+
+    def add_user_files_many(
+        self,
+        rows: list,
+    ) -> None:
+        """Inserts (type, path, user_id) rows with a single executemany"""
+        start = time.perf_counter()
+        self.cursor.executemany(
+            """
+            INSERT INTO user_files (file_type, file_path, user_id)
+            VALUES (?, ?, ?)
+            ON CONFLICT (user_id) DO NOTHING
+            """,
+            rows,
+        )
+        self.record("user_files", len(rows), start)
+        self.commit()
 
     def add_video_files(
         self,
@@ -195,19 +810,17 @@ class Database:
         path: str,
         video_id: int,
     ) -> None:
+        start = time.perf_counter()
         self.cursor.execute(
             """
             INSERT INTO video_files (file_type, file_path, video_id)
-            SELECT ?, ?, ?
-            WHERE NOT EXISTS (
-                SELECT 1
-                FROM video_files
-                WHERE video_id = ?
-            )
+            VALUES (?, ?, ?)
+            ON CONFLICT (video_id) DO NOTHING
             """,
-            (type, path, video_id, video_id),
+            (type, path, video_id),
         )
-        self.conn.commit()
+        self.record("video_files", 1, start)
+        self.commit()
 
     def add_channel_files(
         self,
@@ -215,21 +828,187 @@ class Database:
         path: str,
         channel_id: int,
     ) -> None:
+        start = time.perf_counter()
         self.cursor.execute(
             """
             INSERT INTO channel_files (file_type, file_path, channel_id)
-            SELECT ?, ?, ?
-            WHERE NOT EXISTS (
-                SELECT 1
-                FROM channel_files
-                WHERE channel_id = ?
-            )
+            VALUES (?, ?, ?)
+            ON CONFLICT (channel_id) DO NOTHING
             """,
-            (type, path, channel_id, channel_id),
+            (type, path, channel_id),
         )
-        self.conn.commit()
+        self.record("channel_files", 1, start)
+        self.commit()
+
+    def get_file_queue(
+        self,
+        table: str,
+        refresh: bool = False,
+    ) -> list:
+        """
+        Returns the (file_id, url, local_path, etag, last_modified) rows of a
+        table of FILE_TABLES that haven't been downloaded yet, or of all its
+        files with `refresh`.
+        """
+        if table not in FILE_TABLES:
+            raise ValueError(f"{table} is not a table of files")
+
+        return self.cursor.execute(
+            f"""
+            SELECT file_id, file_path, file_local_path, file_etag, file_last_modified
+            FROM {table}
+            WHERE file_path IS NOT NULL AND file_path != ''
+            {"" if refresh else "AND file_local_path IS NULL"}
+            ORDER BY file_id
+            """
+        ).fetchall()
+
+    def save_files(
+        self,
+        table: str,
+        rows: list,
+    ) -> None:
+        """Stores (local_path, size, hash, etag, last_modified, file_id) rows of downloaded files"""
+        start = time.perf_counter()
+        if table not in FILE_TABLES:
+            raise ValueError(f"{table} is not a table of files")
+
+        self.cursor.executemany(
+            f"""
+            UPDATE {table} SET
+                file_local_path = ?,
+                file_size = ?,
+                file_hash = ?,
+                file_etag = ?,
+                file_last_modified = ?
+            WHERE file_id = ?
+            """,
+            rows,
+        )
+        self.record(table, len(rows), start)
+        self.commit()
+
+    def reset_checkpoint(
+        self,
+        channel_id: int,
+    ) -> None:
+        """Forgets the crawl state of a channel so that the next crawl starts over"""
+        self.cursor.execute(
+            "DELETE FROM crawl_videos WHERE channel_id = ?",
+            (channel_id,),
+        )
+        self.cursor.execute(
+            "DELETE FROM crawl_channels WHERE channel_id = ?",
+            (channel_id,),
+        )
+        self.commit()
+
+    def add_video_queue(
+        self,
+        channel_id: int,
+        videos: list,
+        cursor: str,
+    ) -> None:
+        """
+        Appends (video_key, duration, preview) rows to the videos queue of a channel
+        and stores the continuation token of the next page of the video list,
+        None once the list is exhausted.
+        """
+        start = time.perf_counter()
+        self.cursor.execute(
+            "SELECT COUNT(*) FROM crawl_videos WHERE channel_id = ?",
+            (channel_id,),
+        )
+        position = self.cursor.fetchone()[0]
+        self.cursor.executemany(
+            """
+            INSERT INTO crawl_videos (video_key, channel_id, position, video_duration, video_preview)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (video_key) DO NOTHING
+            """,
+            [
+                (key, channel_id, position + number, duration, preview)
+                for number, (key, duration, preview) in enumerate(videos)
+            ],
+        )
+        self.cursor.execute(
+            """
+            INSERT INTO crawl_channels (channel_id, video_cursor) VALUES (?, ?)
+            ON CONFLICT (channel_id) DO UPDATE SET video_cursor = excluded.video_cursor
+            """,
+            (channel_id, cursor),
+        )
+        self.record("crawl_videos", len(videos), start)
+        self.commit()
+
+    def get_video_cursor(
+        self,
+        channel_id: int,
+    ) -> tuple:
+        """Returns (started, cursor) of the video list of a channel"""
+        self.cursor.execute(
+            "SELECT video_cursor FROM crawl_channels WHERE channel_id = ?",
+            (channel_id,),
+        )
+        row = self.cursor.fetchone()
+
+        return row is not None, row[0] if row else None
+
+    def get_video_queue(
+        self,
+        channel_id: int,
+    ) -> list:
+        """
+        Returns the videos queue of a channel as (video_key, duration, preview,
+        status, video_id, comment_count, comment_tokens) rows in crawl order.
+        comment_tokens are the state of the CommentFrontier of the video, None if
+        the comments haven't been started.
+        """
+        self.cursor.execute(
+            """
+            SELECT video_key, video_duration, video_preview, status, video_id, comment_count, comment_tokens
+            FROM crawl_videos
+            WHERE channel_id = ?
+            ORDER BY position
+            """,
+            (channel_id,),
+        )
+
+        return [
+            (*row[:6], None if row[6] is None else json.loads(row[6]))
+            for row in self.cursor.fetchall()
+        ]
+
+    def save_video_checkpoint(
+        self,
+        key: str,
+        status: str,
+        video_id: int,
+        comment_count: int = 0,
+        comment_tokens: dict = None,
+    ) -> None:
+        """Stores the progress of a video, should be called in the transaction of its data"""
+        start = time.perf_counter()
+        self.cursor.execute(
+            """
+            UPDATE crawl_videos
+            SET status = ?, video_id = ?, comment_count = ?, comment_tokens = ?
+            WHERE video_key = ?
+            """,
+            (
+                status,
+                video_id,
+                comment_count,
+                None if comment_tokens is None else json.dumps(comment_tokens),
+                key,
+            ),
+        )
+        self.record("crawl_videos", 1, start)
+        self.commit()
 
     def conn_close(
         self,
     ) -> None:
-        self.conn.close()
+        """Closes the connection, a shared one stays open for the other writers"""
+        if self.manager is None:
+            self.conn.close()
@@ -1,4 +1,24 @@
-from crawler.find_keys import find_keys
+from typing import NamedTuple
+from crawler.find_keys import key_finder
+from crawler.number_parser import parse_count
+
+
+# Default of the optional parts of a comment, it is never modified
+EMPTY = {}
+
+
+class CommentRecord(NamedTuple):
+    """Data of a comment, a tuple is small and cheap to send from parser processes"""
+
+    user_name: str
+    # None for authors without a channel
+    user_link: str
+    user_avatar: str
+    comment_text: str
+    comment_date: str
+    comment_likes: str
+    comment_like_count: int
+    comment_key: str
 
 
 class VideoExtractor:
@@ -17,7 +37,9 @@ class VideoExtractor:
             "video_name": None,
             "video_link": None,
             "video_views": None,
+            "video_view_count": None,
             "video_likes": None,
+            "video_like_count": None,
             "video_date": None,
             "video_duration": None,
             "video_preview": None,
@@ -30,16 +52,18 @@ class VideoExtractor:
     ) -> dict:
         video = self.new_video()
 
-        videoPrimaryInfoRenderer = find_keys(self.element, "videoPrimaryInfoRenderer")
+        videoPrimaryInfoRenderer = key_finder.find_first(
+            self.element, "videoPrimaryInfoRenderer"
+        )
 
-        video["video_name"] = videoPrimaryInfoRenderer[0]["title"]["runs"][0]["text"]
+        video["video_name"] = videoPrimaryInfoRenderer["title"]["runs"][0]["text"]
         video["video_link"] = f"https://www.youtube.com/watch?v={link}"
-        video["video_views"] = videoPrimaryInfoRenderer[0]["viewCount"][
+        video["video_views"] = videoPrimaryInfoRenderer["viewCount"][
             "videoViewCountRenderer"
         ]["viewCount"]["simpleText"]
-        video["video_likes"] = videoPrimaryInfoRenderer[0]["videoActions"][
-            "menuRenderer"
-        ]["topLevelButtons"][0]["segmentedLikeDislikeButtonRenderer"]["likeButton"][
+        video["video_likes"] = videoPrimaryInfoRenderer["videoActions"]["menuRenderer"][
+            "topLevelButtons"
+        ][0]["segmentedLikeDislikeButtonRenderer"]["likeButton"][
             "toggleButtonRenderer"
         ][
             "defaultText"
@@ -50,7 +74,9 @@ class VideoExtractor:
         ][
             "label"
         ]
-        video["video_date"] = videoPrimaryInfoRenderer[0]["dateText"]["simpleText"]
+        video["video_view_count"] = parse_count(video["video_views"])
+        video["video_like_count"] = parse_count(video["video_likes"])
+        video["video_date"] = videoPrimaryInfoRenderer["dateText"]["simpleText"]
         video["video_duration"] = duration
 
         return video
@@ -71,6 +97,7 @@ class ChannelExtractor:
         return {
             "channel_name": None,
             "channel_amount_followers": None,
+            "channel_follower_count": None,
             "channel_link": None,
             "channel_avatar": None,
         }
@@ -85,6 +112,9 @@ class ChannelExtractor:
         channel["channel_amount_followers"] = self.element["header"][
             "c4TabbedHeaderRenderer"
         ]["subscriberCountText"]["simpleText"]
+        channel["channel_follower_count"] = parse_count(
+            channel["channel_amount_followers"]
+        )
         channel["channel_link"] = f"https://www.youtube.com/{name}"
         channel["channel_avatar"] = self.element["header"]["c4TabbedHeaderRenderer"][
             "avatar"
@@ -94,7 +124,12 @@ class ChannelExtractor:
 
 
 class CommentExtractor:
-    """Class for extracting data from a comment"""
+    """
+    Class for extracting data from a comment.
+    Comments are the bulk of a crawl, so they are extracted into compact
+    CommentRecord tuples, and missing optional fields fall back to their
+    defaults without raising.
+    """
 
     def __init__(
         self,
@@ -102,47 +137,26 @@ class CommentExtractor:
     ) -> None:
         self.element = element
 
-    def new_comment(
-        self,
-    ) -> dict:
-        return {
-            "user_name": None,
-            "user_link": None,
-            "user_avatar": None,
-            "comment_text": None,
-            "comment_date": None,
-            "comment_likes": None,
-        }
-
     def comment_extract(
         self,
-    ) -> dict:
-        comment = self.new_comment()
-
-        try:
-            comment["user_name"] = self.element["authorText"]["simpleText"]
-        except:
-            comment["user_name"] = ""
-        try:
-            comment["user_link"] = self.element["authorEndpoint"]["browseEndpoint"][
-                "browseId"
-            ]
-        except:
-            comment["user_link"] = ""
-        try:
-            comment["comment_text"] = "".join(
-                txt["text"] for txt in self.element["contentText"]["runs"]
-            )
-        except:
-            comment["comment_text"] = ""
-        comment["comment_date"] = self.element["publishedTimeText"]["runs"][0]["text"]
-        try:
-            comment["comment_likes"] = self.element["voteCount"]["simpleText"]
-        except:
-            comment["comment_likes"] = 0
-        try:
-            comment["user_avatar"] = self.element["authorThumbnail"][2]["url"]
-        except:
-            comment["user_avatar"] = ""
-
-        return comment
+    ) -> CommentRecord:
+        element = self.element
+
+        likes = element.get("voteCount", EMPTY).get("simpleText", 0)
+        thumbnails = element.get("authorThumbnail", EMPTY).get("thumbnails")
+
+        return CommentRecord(
+            user_name=element.get("authorText", EMPTY).get("simpleText", ""),
+            user_link=element.get("authorEndpoint", EMPTY)
+            .get("browseEndpoint", EMPTY)
+            .get("browseId"),
+            user_avatar=thumbnails[-1]["url"] if thumbnails else "",
+            comment_text="".join(
+                run.get("text", "")
+                for run in element.get("contentText", EMPTY).get("runs", ())
+            ),
+            comment_date=element["publishedTimeText"]["runs"][0]["text"],
+            comment_likes=likes,
+            comment_like_count=parse_count(likes),
+            comment_key=element.get("commentId"),
+        )
@@ -1,22 +1,105 @@
 import json
 
+from itertools import islice
+from typing import Iterator
+
+
+MISSING = object()
+
+
+def children(
+    data: json,
+) -> Iterator[tuple]:
+    """Function for iterating over (key, value) pairs of a dict or (index, item) of a list"""
+    if isinstance(data, dict):
+        return iter(data.items())
+    if isinstance(data, list):
+        return enumerate(data)
+    return iter(())
+
+
+def iter_keys(
+    json_data: json,
+    target_keys: tuple,
+) -> Iterator[tuple]:
+    """
+    Function for lazily finding keys in json.
+    Yields (path, value) for every key from `target_keys` in the same order as a
+    recursive walk would, the last element of the path is the found key.
+    The walk uses an explicit stack and stops as soon as the caller stops iterating.
+    """
+    targets = frozenset(target_keys)
+    stack = [[children(json_data), None]]
+
+    while stack:
+        frame = stack[-1]
+        for key, value in frame[0]:
+            frame[1] = key
+            if key in targets:
+                yield tuple(step for _, step in stack), value
+            if isinstance(value, (dict, list)):
+                stack.append([children(value), None])
+                break
+        else:
+            stack.pop()
+
 
 def find_keys(
     json_data: json,
     target_key: str,
+    limit: int = None,
 ) -> list:
-    """Function for finding keys in json"""
-    results = []
-
-    def find_key(data):
-        if isinstance(data, dict):
-            for key, value in data.items():
-                if key == target_key:
-                    results.append(value)
-                find_key(value)
-        elif isinstance(data, list):
-            for item in data:
-                find_key(item)
-
-    find_key(json_data)
-    return results
+    """Function for finding keys in json, at most `limit` matches are collected"""
+    return [value for _, value in islice(iter_keys(json_data, (target_key,)), limit)]
+
+
+def follow(
+    json_data: json,
+    path: tuple,
+) -> json:
+    """Function for getting the value at `path`, returns MISSING if there is none"""
+    for step in path:
+        if isinstance(json_data, dict):
+            json_data = json_data.get(step, MISSING)
+        elif isinstance(json_data, list) and isinstance(step, int):
+            json_data = json_data[step] if step < len(json_data) else MISSING
+        else:
+            return MISSING
+        if json_data is MISSING:
+            return MISSING
+
+    return json_data
+
+
+class KeyFinder:
+    """
+    Class for finding the first match of a key in json.
+    The path of the last match of every key is remembered and tried first,
+    the whole document is walked only when the page layout has changed.
+    """
+
+    def __init__(
+        self,
+    ) -> None:
+        self.paths = {}
+
+    def find_first(
+        self,
+        json_data: json,
+        target_key: str,
+        default: json = None,
+    ) -> json:
+        path = self.paths.get(target_key)
+        if path is not None:
+            value = follow(json_data, path)
+            if value is not MISSING:
+                return value
+
+        for path, value in iter_keys(json_data, (target_key,)):
+            self.paths[target_key] = path
+            return value
+
+        return default
+
+
+key_finder = KeyFinder()
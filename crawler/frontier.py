@@ -0,0 +1,89 @@
+from collections import deque
+
+
+class CommentFrontier:
+    """
+    Class for the pending continuation tokens of the comments on a video.
+    Tokens of the top-level comment pages and of the reply threads are kept in
+    two deques, so adding and taking a token is O(1), and a token is queued at
+    most once. The `order` decides which token is requested next:
+    "threads" - pages of top-level comments first, replies after them,
+    "replies" - replies first, every thread is finished before the next page,
+    "fifo" - in the order the tokens were found.
+    """
+
+    orders = ("threads", "replies", "fifo")
+
+    def __init__(
+        self,
+        order: str = "threads",
+    ) -> None:
+        if order not in self.orders:
+            raise ValueError(f"Unknown comment order: {order}")
+        self.order = order
+        self.threads = deque()
+        self.replies = self.threads if order == "fifo" else deque()
+        self.seen = set()
+
+    @classmethod
+    def from_state(
+        cls,
+        state,
+        order: str = "threads",
+    ) -> "CommentFrontier":
+        """
+        Restores a frontier from its state(), or from the plain list of tokens of
+        older checkpoints, which were requested from the end.
+        """
+        frontier = cls(order)
+        if isinstance(state, dict):
+            frontier.extend((token, False) for token in state["threads"])
+            frontier.extend((token, True) for token in state["replies"])
+        else:
+            frontier.extend((token, False) for token in reversed(state))
+        return frontier
+
+    def state(
+        self,
+    ) -> dict:
+        """Pending tokens as a JSON-serializable checkpoint"""
+        if self.order == "fifo":
+            return {"threads": list(self.threads), "replies": []}
+        return {"threads": list(self.threads), "replies": list(self.replies)}
+
+    def add(
+        self,
+        token: str,
+        reply: bool = False,
+    ) -> bool:
+        """Queues a token, returns False if it has already been queued"""
+        if token in self.seen:
+            return False
+        self.seen.add(token)
+        (self.replies if reply else self.threads).append(token)
+        return True
+
+    def extend(
+        self,
+        tokens: list,
+    ) -> None:
+        """Queues (token, reply) pairs"""
+        for token, reply in tokens:
+            self.add(token, reply)
+
+    def pop(
+        self,
+    ) -> str:
+        """Takes the next token to request, raises IndexError if there are none"""
+        if self.order == "replies":
+            first, second = self.replies, self.threads
+        else:
+            first, second = self.threads, self.replies
+        return (first or second).popleft()
+
+    def __len__(
+        self,
+    ) -> int:
+        if self.order == "fifo":
+            return len(self.threads)
+        return len(self.threads) + len(self.replies)
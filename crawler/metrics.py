@@ -0,0 +1,241 @@
+"""
+Instrumentation of a crawl.
+A CrawlStats collects the timers and counters of all the stages of a crawl,
+from any thread, and exports them as JSON or in the Prometheus text format.
+The crawlers dump their stats at the end of every run to the file given to
+them or, e.g. for the GUI, to the one in the environment variable
+YOUTUBE_CRAWLER_METRICS.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+
+from contextlib import contextmanager
+from typing import Iterator
+
+
+class CrawlStats:
+    """
+    Class for the timers and counters of a crawl, safe to update from any thread.
+    Metrics have a name and optional labels, e.g.
+    stats.add_time("http", 0.25, endpoint="next"). The crawler records:
+        http        timer, request latency per endpoint
+        http_bytes  counter, response bytes per endpoint
+        http_errors counter, error responses per endpoint
+        parse       timer, parsing time per step: decode (regex and JSON),
+                    find_keys and extract
+        sql         timer, time of the statements per table
+        commit      timer, time of the commits
+        rows        counter, rows written per table
+        videos      counter, videos finished
+    """
+
+    prefix = "youtube_crawler"
+
+    def __init__(
+        self,
+    ) -> None:
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.start = time.perf_counter()
+        # (name, labels) -> [count, total seconds, max seconds]
+        self.timers = {}
+        # (name, labels) -> value
+        self.counters = {}
+
+    def add_time(
+        self,
+        name: str,
+        seconds: float,
+        **labels,
+    ) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            timer = self.timers.get(key)
+            if timer is None:
+                self.timers[key] = [1, seconds, seconds]
+            else:
+                timer[0] += 1
+                timer[1] += seconds
+                if seconds > timer[2]:
+                    timer[2] = seconds
+
+    def count(
+        self,
+        name: str,
+        value: int = 1,
+        **labels,
+    ) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    @contextmanager
+    def timer(
+        self,
+        name: str,
+        **labels,
+    ) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start, **labels)
+
+    def elapsed(
+        self,
+    ) -> float:
+        return time.perf_counter() - self.start
+
+    def total(
+        self,
+        name: str,
+    ) -> tuple:
+        """Returns the (count, seconds) of a timer summed over all its labels"""
+        count, seconds = 0, 0.0
+        with self.lock:
+            for (timer_name, _), timer in self.timers.items():
+                if timer_name == name:
+                    count += timer[0]
+                    seconds += timer[1]
+        return count, seconds
+
+    def value(
+        self,
+        name: str,
+        **labels,
+    ) -> int:
+        """Returns a counter, summed over all its labels unless they are given"""
+        with self.lock:
+            if labels:
+                return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+            return sum(
+                value
+                for (counter_name, _), value in self.counters.items()
+                if counter_name == name
+            )
+
+    def summary(
+        self,
+    ) -> str:
+        """A few lines about every stage, short enough for the GUI"""
+        requests, http_seconds = self.total("http")
+        _, parse_seconds = self.total("parse")
+        _, sql_seconds = self.total("sql")
+        _, commit_seconds = self.total("commit")
+        megabytes = self.value("http_bytes") / 2**20
+
+        lines = [
+            f"{self.elapsed():.1f} s, HTTP: {requests:,} requests, {megabytes:.1f} MB, "
+            f"{http_seconds / max(requests, 1) * 1000:.0f} ms on average",
+            f"Parsing: {parse_seconds:.1f} s, SQL: {sql_seconds + commit_seconds:.1f} s",
+            ", ".join(
+                f"{counter['labels']['table']}: {counter['value']:,}"
+                for counter in self.snapshot()["counters"]
+                if counter["name"] == "rows" and counter["value"]
+            ),
+        ]
+        return "\n".join(line for line in lines if line)
+
+    def snapshot(
+        self,
+    ) -> dict:
+        with self.lock:
+            return {
+                "started": self.started,
+                "elapsed": self.elapsed(),
+                "timers": [
+                    {
+                        "name": name,
+                        "labels": dict(labels),
+                        "count": count,
+                        "seconds": seconds,
+                        "max_seconds": maximum,
+                    }
+                    for (name, labels), (count, seconds, maximum) in sorted(
+                        self.timers.items()
+                    )
+                ],
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self.counters.items())
+                ],
+            }
+
+    def to_json(
+        self,
+    ) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(
+        self,
+    ) -> str:
+        """The metrics in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = [
+            f"# TYPE {self.prefix}_elapsed_seconds gauge",
+            f"{self.prefix}_elapsed_seconds {snapshot['elapsed']}",
+        ]
+
+        typed = set()
+        for timer in snapshot["timers"]:
+            metric = f"{self.prefix}_{timer['name']}_seconds"
+            labels = self.labels(timer["labels"])
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} summary")
+            lines.append(f"{metric}_sum{labels} {timer['seconds']}")
+            lines.append(f"{metric}_count{labels} {timer['count']}")
+
+        for counter in snapshot["counters"]:
+            metric = f"{self.prefix}_{counter['name']}_total"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{self.labels(counter['labels'])} {counter['value']}")
+
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def labels(
+        labels: dict,
+    ) -> str:
+        if not labels:
+            return ""
+        escaped = (
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            for value in labels.values()
+        )
+        return (
+            "{"
+            + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped))
+            + "}"
+        )
+
+    @staticmethod
+    def destination(
+        path: str = None,
+    ) -> str:
+        """The file to dump the metrics to: `path`, the one of the environment or None"""
+        return path or os.environ.get("YOUTUBE_CRAWLER_METRICS") or None
+
+    def dump(
+        self,
+        path: str,
+    ) -> None:
+        """
+        Writes the metrics to `path`, in the Prometheus format if it ends with .prom.
+        The file is replaced at once, so crawlers sharing the stats can dump them
+        at the same time and readers never see a partial file.
+        """
+        text = self.to_prometheus() if path.endswith(".prom") else self.to_json()
+        descriptor, temporary = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(path))
+        )
+        with os.fdopen(descriptor, "w") as file:
+            file.write(text)
+        # mkstemp creates the file for its owner only, scrapers have to read it
+        os.chmod(temporary, 0o644)
+        os.replace(temporary, path)
@@ -0,0 +1,46 @@
+import re
+
+from functools import lru_cache
+
+
+# The first number of a display string with an optional K/M/B suffix, e.g.
+# "1.2M subscribers", "123,456 views", "like this video along with 1,024 other people"
+COUNT = re.compile(r"(\d+(?:,\d{3})*(?:\.\d+)?)([KMB]\b)?", re.IGNORECASE)
+
+MULTIPLIERS = {
+    None: 1,
+    "k": 10**3,
+    "m": 10**6,
+    "b": 10**9,
+}
+
+ZERO_WORDS = frozenset(("no", "none", "zero"))
+
+
+@lru_cache(maxsize=4096)
+def parse_count(
+    text: str,
+) -> int:
+    """
+    Function for converting a YouTube display count to an integer.
+    Returns None if there is no count in the text, "No views" is 0.
+    Display strings repeat a lot, so the results are cached.
+    """
+    if text is None:
+        return None
+    if isinstance(text, int):
+        return text
+
+    match = COUNT.search(text)
+    if match is None:
+        words = text.split(maxsplit=1)
+        if words and words[0].lower() in ZERO_WORDS:
+            return 0
+        return None
+
+    number, suffix = match.groups()
+    multiplier = MULTIPLIERS[suffix and suffix.lower()]
+    number = number.replace(",", "")
+    if multiplier == 1 and "." not in number:
+        return int(number)
+    return round(float(number) * multiplier)
@@ -0,0 +1,86 @@
+import json
+import re
+
+
+decoder = json.JSONDecoder()
+
+CONFIG = "ytcfg"
+INITIAL_DATA = "ytInitialData"
+
+# The page is scanned once for any of the markers, the JSON payload that follows
+# a marker is decoded in place and the scan continues after its end.
+MARKERS = {
+    "ytcfg.set(": CONFIG,
+    "var ytInitialData = ": INITIAL_DATA,
+    'window["ytInitialData"] = ': INITIAL_DATA,
+}
+
+
+def scan_page(
+    page: str,
+    targets: tuple = (CONFIG, INITIAL_DATA),
+) -> dict:
+    """
+    Function for extracting JSON payloads from a YouTube HTML page in one pass.
+    json.JSONDecoder.raw_decode reads exactly one brace-balanced value at the
+    offset of a marker, strings included, so neither the end of the payload has to
+    be searched for nor a substring of the page has to be copied.
+    Returns a dict from target name (ytcfg, ytInitialData) to the decoded payload.
+    """
+    pattern = re.compile(
+        "|".join(
+            re.escape(marker) for marker, name in MARKERS.items() if name in targets
+        )
+    )
+    found = {}
+    position = 0
+
+    while len(found) < len(targets):
+        match = pattern.search(page, position)
+        if match is None:
+            break
+        position = match.end()
+
+        name = MARKERS[match.group()]
+        if name in found:
+            continue
+
+        while page[position : position + 1].isspace():
+            position += 1
+        if page[position : position + 1] != "{":
+            continue
+
+        try:
+            payload, position = decoder.raw_decode(page, position)
+        except json.JSONDecodeError:
+            continue
+
+        # ytcfg.set is called several times on a page, only one call has the API key
+        if name == CONFIG and "INNERTUBE_API_KEY" not in payload:
+            continue
+        found[name] = payload
+
+    return found
+
+
+def parse_page(
+    page: str,
+) -> tuple:
+    """Function for extracting the (ytcfg, ytInitialData) pair from a channel page"""
+    found = scan_page(page)
+    for name in (CONFIG, INITIAL_DATA):
+        if name not in found:
+            raise ValueError(f"{name} is not found on the page")
+
+    return found[CONFIG], found[INITIAL_DATA]
+
+
+def parse_initial_data(
+    page: str,
+) -> dict:
+    """Function for extracting ytInitialData from a video page"""
+    found = scan_page(page, (INITIAL_DATA,))
+    if INITIAL_DATA not in found:
+        raise ValueError(f"{INITIAL_DATA} is not found on the page")
+
+    return found[INITIAL_DATA]
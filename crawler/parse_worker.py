@@ -0,0 +1,161 @@
+"""
+Parsing stage of the crawler.
+Every function takes a raw response body and returns only the compact records
+extracted from it, so that they can run in worker processes of a
+ProcessPoolExecutor and send back little more than the data to be stored.
+Run through timed(), they also return the seconds spent on every step.
+"""
+import json
+import threading
+import time
+
+from typing import Callable
+
+from crawler.extractors import VideoExtractor, ChannelExtractor, CommentExtractor
+from crawler.find_keys import find_keys, iter_keys, key_finder
+from crawler.page_parser import parse_page, parse_initial_data
+
+
+local = threading.local()
+
+
+def record(
+    step: str,
+    seconds: float,
+) -> None:
+    """Adds seconds to a step of the current timed() call"""
+    timings = getattr(local, "timings", None)
+    if timings is not None:
+        timings[step] = timings.get(step, 0.0) + seconds
+
+
+def measure(
+    step: str,
+    start: float,
+) -> float:
+    """Adds the time since `start` to a step, returns the current time"""
+    now = time.perf_counter()
+    record(step, now - start)
+    return now
+
+
+def timed(
+    function: Callable,
+    *args,
+) -> tuple:
+    """
+    Runs a parse function, returns its result and the seconds it spent per step:
+    decode (the regexes and JSON), find_keys and extract.
+    """
+    local.timings = {}
+    try:
+        result = function(*args)
+        return result, local.timings
+    finally:
+        local.timings = None
+
+
+def extract_videos(
+    page: dict,
+) -> tuple:
+    """Returns the (video_key, duration, preview) rows of a page and the cursor of the next one"""
+    start = time.perf_counter()
+    videos = [
+        (
+            video["videoId"],
+            video["lengthText"]["simpleText"],
+            video["thumbnail"]["thumbnails"][3]["url"],
+        )
+        for video in find_keys(page, "videoRenderer")
+    ]
+    continuations = find_keys(page, "continuationEndpoint", limit=1)
+    cursor = continuations[0]["continuationCommand"]["token"] if continuations else None
+    measure("find_keys", start)
+
+    return videos, cursor
+
+
+def parse_channel_page(
+    body: bytes,
+    name: str,
+) -> tuple:
+    """Returns (config, channel_data, videos, cursor) of a channel videos page"""
+    start = time.perf_counter()
+    config, initial_data = parse_page(body.decode())
+    start = measure("decode", start)
+    config = {
+        "INNERTUBE_API_KEY": config["INNERTUBE_API_KEY"],
+        "INNERTUBE_CONTEXT": config["INNERTUBE_CONTEXT"],
+    }
+    config["INNERTUBE_CONTEXT"]["client"]["hl"] = "en"
+
+    channel_data = ChannelExtractor(initial_data).channel_extract(name)
+    measure("extract", start)
+
+    return (config, channel_data, *extract_videos(initial_data))
+
+
+def parse_videos_page(
+    body: bytes,
+) -> tuple:
+    """Returns (videos, cursor) of a browse continuation of the video list"""
+    start = time.perf_counter()
+    page = json.loads(body)
+    measure("decode", start)
+    return extract_videos(page)
+
+
+def parse_video_page(
+    body: bytes,
+    link: str,
+    duration: str,
+) -> tuple:
+    """Returns (video_data, token) of a watch page, token starts its comments"""
+    start = time.perf_counter()
+    initial_data = parse_initial_data(body.decode())
+    start = measure("decode", start)
+
+    video_data = VideoExtractor(initial_data).video_extract(link, duration)
+    start = measure("extract", start)
+    token = key_finder.find_first(initial_data, "subMenuItems")[0]["serviceEndpoint"][
+        "continuationCommand"
+    ]["token"]
+    measure("find_keys", start)
+
+    return video_data, token
+
+
+def parse_comment_page(
+    body: bytes,
+) -> tuple:
+    """
+    Returns (comments, tokens) of a comments continuation, tokens continue it.
+    Tokens are (token, reply) pairs in page order, reply tokens load the replies
+    of a comment thread and the others the next page of top-level comments.
+    """
+    start = time.perf_counter()
+    page = json.loads(body)
+    start = measure("decode", start)
+
+    # Extraction runs between the steps of the key search, it is timed per comment
+    # and the rest of the loop is the search
+    comments = []
+    tokens = []
+    extract = 0.0
+    for path, value in iter_keys(page, ("continuationEndpoint", "commentRenderer")):
+        if path[-1] == "commentRenderer":
+            started = time.perf_counter()
+            comments.append(CommentExtractor(value).comment_extract())
+            extract += time.perf_counter() - started
+        else:
+            tokens.append(
+                (
+                    value["continuationCommand"]["token"],
+                    "commentRepliesRenderer" in path,
+                )
+            )
+
+    measure("find_keys", start + extract)
+    record("extract", extract)
+
+    return comments, tokens
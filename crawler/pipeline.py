@@ -0,0 +1,342 @@
+"""
+Staged pipeline crawling the videos of a channel:
+
+    fetch queue -> fetchers -> parse queue -> parsers -> write queue -> writer
+
+Fetchers only do network work; with an executor shared by several crawls
+they are jobs of the executor, one per request, instead of threads. Parsers run crawler.parse_worker, which parses
+a page and extracts the records from it in one step (in the parser executor of
+the crawler when it has one), and schedule the next request of the video.
+A single writer, the thread calling CrawlPipeline.run, writes the records and
+the checkpoints to the database.
+
+The parse and write queues are bounded, so a slow stage blocks the stages in
+front of it instead of piling up pages in memory. Every video has at most one
+request in the fetchers and parsers at a time and at most `active_videos`
+videos are crawled at once, which bounds the fetch queue as well.
+"""
+import queue
+import threading
+
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Callable
+from crawler.db import Database
+from crawler.frontier import CommentFrontier
+from crawler.parse_worker import parse_video_page, parse_comment_page
+
+
+class PipelineStopped(Exception):
+    """Raised in a stage when the pipeline is stopped"""
+
+
+class VideoTask:
+    """
+    Crawl state of one video.
+    It is owned by the stage holding it, so its fields need no lock: the writer
+    only gets copies of comment_count and of the state of the frontier.
+    frontier is None until the watch page of the video has been parsed.
+    """
+
+    def __init__(
+        self,
+        key: str,
+        duration: str,
+        preview: str,
+        video_id: int = None,
+        comment_count: int = 0,
+        frontier: CommentFrontier = None,
+    ) -> None:
+        self.key = key
+        self.duration = duration
+        self.preview = preview
+        self.video_id = video_id
+        self.comment_count = comment_count
+        self.frontier = frontier
+        self.token = None
+
+
+class CrawlPipeline:
+    """
+    Class for crawling videos with `fetchers` fetching threads and `parsers`
+    parsing threads, connected by queues of at most `queue_size` pages.
+    When an `executor` is given, e.g. a pool shared by several crawls, there
+    are no fetching threads: every request is a job of the executor instead,
+    so that the crawls sharing it take turns at its workers. Comment continuations are requested in `comment_order`,
+    see CommentFrontier, and at most `comment_amount` comments of a video are
+    written: the page reaching it is cut, and no more pages are requested.
+    """
+
+    poll_interval = 0.1
+
+    def __init__(
+        self,
+        crawler,
+        config: dict,
+        comment_amount: int,
+        fetchers: int = 4,
+        parsers: int = 1,
+        queue_size: int = 16,
+        active_videos: int = None,
+        executor: Executor = None,
+        comment_order: str = "threads",
+    ) -> None:
+        self.crawler = crawler
+        self.config = config
+        self.comment_amount = comment_amount
+        self.fetchers = max(1, fetchers)
+        self.parsers = max(1, parsers)
+        self.active_videos = max(1, active_videos or 2 * self.fetchers)
+        self.executor = executor
+        self.comment_order = comment_order
+
+        # The jobs of a shared executor must not block its workers on a full
+        # parse queue, which holds at most one page per active video anyway
+        parse_size = max(1, queue_size)
+        if executor is not None:
+            parse_size = max(parse_size, self.active_videos)
+        self.queues = {
+            "fetch": queue.Queue(),
+            "parse": queue.Queue(parse_size),
+            "write": queue.Queue(max(1, queue_size)),
+        }
+        self.peak_depths = dict.fromkeys(self.queues, 0)
+        self.pending = deque()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def depths(
+        self,
+    ) -> dict:
+        """Current number of items waiting in front of every stage"""
+        return {name: stage.qsize() for name, stage in self.queues.items()}
+
+    def put(
+        self,
+        name: str,
+        item,
+    ) -> None:
+        """Puts an item into a queue, blocking while it is full"""
+        stage = self.queues[name]
+        while True:
+            if self.stopped.is_set():
+                raise PipelineStopped
+            try:
+                stage.put(item, timeout=self.poll_interval)
+                break
+            except queue.Full:
+                pass
+        depth = stage.qsize()
+        if depth > self.peak_depths[name]:
+            self.peak_depths[name] = depth
+
+    def get(
+        self,
+        name: str,
+    ):
+        """Gets an item from a queue, blocking while it is empty"""
+        stage = self.queues[name]
+        while True:
+            if self.stopped.is_set():
+                raise PipelineStopped
+            try:
+                item = stage.get(timeout=self.poll_interval)
+            except queue.Empty:
+                continue
+            if item is None:
+                raise PipelineStopped
+            return item
+
+    def stop(
+        self,
+    ) -> None:
+        """Stops all the stages, idle ones are woken up at once"""
+        self.stopped.set()
+        for name, count in (("fetch", self.fetchers), ("parse", self.parsers)):
+            for _ in range(count):
+                try:
+                    self.queues[name].put_nowait(None)
+                except queue.Full:
+                    break
+
+    def stage(
+        self,
+        function: Callable,
+    ) -> None:
+        """Runs a stage until the pipeline stops"""
+        self.job(self.repeat, function)
+
+    @staticmethod
+    def repeat(
+        function: Callable,
+    ) -> None:
+        while True:
+            function()
+
+    def job(
+        self,
+        function: Callable,
+        *args,
+    ) -> None:
+        """Runs a function of a stage, its errors are passed to the writer"""
+        try:
+            function(*args)
+        except PipelineStopped:
+            pass
+        except BaseException as error:
+            try:
+                self.put("write", ("error", error))
+            except PipelineStopped:
+                pass
+
+    def fetch(
+        self,
+    ) -> None:
+        task = self.get("fetch")
+        if task.token is None:
+            body = self.crawler.fetch_video(task.key)
+        else:
+            body = self.crawler.fetch_comments(self.config, task.token)
+        self.put("parse", (task, body))
+
+    def parse(
+        self,
+    ) -> None:
+        task, body = self.get("parse")
+        if task.token is None:
+            video_data, token = self.crawler.parse(
+                parse_video_page, body, task.key, task.duration
+            )
+            task.frontier = CommentFrontier(self.comment_order)
+            task.frontier.add(token)
+            self.put("write", ("video", task, video_data))
+        else:
+            comments, tokens = self.crawler.parse(parse_comment_page, body)
+            comments = comments[: self.comment_amount - task.comment_count]
+            task.comment_count += len(comments)
+            if self.comment_amount > task.comment_count:
+                task.frontier.extend(tokens)
+            self.put(
+                "write",
+                (
+                    "comments",
+                    task,
+                    comments,
+                    task.comment_count,
+                    task.frontier.state(),
+                ),
+            )
+        self.schedule(task)
+
+    def has_next(
+        self,
+        task: VideoTask,
+    ) -> bool:
+        """Whether the video still has comments to crawl"""
+        return self.comment_amount > task.comment_count and bool(task.frontier)
+
+    def schedule(
+        self,
+        task: VideoTask,
+    ) -> None:
+        """Queues the next request of a video, or finishes it and starts the next video"""
+        if self.has_next(task):
+            task.token = task.frontier.pop()
+            self.queue_fetch(task)
+            return
+
+        self.put("write", ("done", task, task.comment_count))
+        with self.lock:
+            if not self.pending:
+                return
+            task = self.pending.popleft()
+        self.start(task)
+
+    def start(
+        self,
+        task: VideoTask,
+    ) -> None:
+        if task.frontier is None:
+            task.token = None
+        else:
+            task.token = task.frontier.pop()
+        self.queue_fetch(task)
+
+    def queue_fetch(
+        self,
+        task: VideoTask,
+    ) -> None:
+        """Queues the next request of a video, with a job for it in the shared executor"""
+        self.put("fetch", task)
+        if self.executor is not None:
+            self.executor.submit(self.job, self.fetch)
+
+    def write(
+        self,
+        db: Database,
+        channel_id: int,
+        record: tuple,
+    ) -> bool:
+        """Writes a record of the parsers, returns True when it finishes a video"""
+        kind, task = record[:2]
+        if kind == "video":
+            task.video_id = self.crawler.save_video(
+                db, channel_id, task.key, record[2], task.preview
+            )
+        elif kind == "comments":
+            self.crawler.save_comment_page(db, task.key, task.video_id, *record[2:])
+        else:
+            self.crawler.finish_video(db, task.key, task.video_id, record[2])
+            return True
+        return False
+
+    def run(
+        self,
+        db: Database,
+        channel_id: int,
+        tasks: list,
+        video_callback: Callable[[], None],
+    ) -> None:
+        """
+        Crawls the videos and writes them to the database in the calling thread.
+        video_callback is called after every finished video.
+        """
+        remaining = 0
+        for task in tasks:
+            if task.frontier is not None and not self.has_next(task):
+                self.crawler.finish_video(
+                    db, task.key, task.video_id, task.comment_count
+                )
+                video_callback()
+            else:
+                self.pending.append(task)
+                remaining += 1
+        if not remaining:
+            return
+
+        for _ in range(min(self.active_videos, remaining)):
+            self.start(self.pending.popleft())
+
+        # With a shared executor every queued request has a job in it already
+        fetchers = None
+        if self.executor is None:
+            fetchers = ThreadPoolExecutor(self.fetchers)
+            for _ in range(self.fetchers):
+                fetchers.submit(self.stage, self.fetch)
+        parsers = ThreadPoolExecutor(self.parsers)
+        for _ in range(self.parsers):
+            parsers.submit(self.stage, self.parse)
+
+        try:
+            while remaining:
+                record = self.queues["write"].get()
+                if record[0] == "error":
+                    raise record[1]
+                if self.write(db, channel_id, record):
+                    remaining -= 1
+                    video_callback()
+        finally:
+            self.stop()
+            parsers.shutdown()
+            if fetchers is not None:
+                fetchers.shutdown()
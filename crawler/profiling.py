@@ -0,0 +1,175 @@
+"""
+Opt-in profiling of crawl runs.
+A CrawlProfiler wraps a run of YouTubeCrawler.load_channel: it profiles the
+calling thread and every thread started during the run with cProfile, and
+can take tracemalloc snapshots every few finished videos. The pstats dump,
+the snapshots and a summary of the top hotspots are written next to the
+database, named after it and the start of the run, e.g.
+    youtube.db.20240101-120000.pstats
+    youtube.db.20240101-120000.video10.tracemalloc
+    youtube.db.20240101-120000.txt
+so that runs of different versions can be compared offline with pstats and
+tracemalloc.Snapshot.load().compare_to().
+It is switched on with `python -m crawler crawl --profile` or, e.g. for the
+GUI, with the environment variables YOUTUBE_CRAWLER_PROFILE=1 and
+YOUTUBE_CRAWLER_TRACEMALLOC=<videos between snapshots>.
+Parsing in worker processes is not profiled.
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+
+class CrawlProfiler:
+    """
+    Class for profiling a crawl run into files starting with `prefix`.
+    With `memory_every` a tracemalloc snapshot is taken after every
+    `memory_every` finished videos. The summary lists the `top` functions.
+    Only one profiler can run at a time, start() of the others returns False.
+    """
+
+    lock = threading.Lock()
+    running = None
+
+    def __init__(
+        self,
+        prefix: str,
+        memory_every: int = 0,
+        top: int = 20,
+    ) -> None:
+        self.prefix = prefix
+        self.memory_every = memory_every
+        self.top = top
+        self.profiles = []
+        self.snapshots = []
+        self.videos = 0
+        self.active = False
+        self.tracing = False
+
+    @classmethod
+    def for_database(
+        cls,
+        path: str,
+        memory_every: int = 0,
+        top: int = 20,
+    ) -> "CrawlProfiler":
+        """A profiler writing its files next to the database at `path`"""
+        prefix = f"{os.path.abspath(path)}.{time.strftime('%Y%m%d-%H%M%S')}"
+        return cls(prefix, memory_every, top)
+
+    @classmethod
+    def from_environment(
+        cls,
+        path: str,
+    ) -> "CrawlProfiler":
+        """The profiler asked for by the environment variables, or None"""
+        enabled = os.environ.get("YOUTUBE_CRAWLER_PROFILE", "") not in ("", "0")
+        memory_every = int(os.environ.get("YOUTUBE_CRAWLER_TRACEMALLOC") or 0)
+        if not enabled and not memory_every:
+            return None
+        return cls.for_database(path, memory_every)
+
+    def start(
+        self,
+    ) -> bool:
+        """Starts profiling, returns False if a profiler is running already"""
+        with CrawlProfiler.lock:
+            if CrawlProfiler.running is not None:
+                return False
+            CrawlProfiler.running = self
+        self.active = True
+
+        if self.memory_every and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.tracing = True
+        threading.setprofile(self.profile_thread)
+        profile = cProfile.Profile()
+        self.profiles.append(profile)
+        profile.enable()
+        return True
+
+    def profile_thread(
+        self,
+        frame,
+        event: str,
+        arg,
+    ) -> None:
+        """Installed by threading.setprofile, starts a profile in a new thread"""
+        sys.setprofile(None)
+        if self.active:
+            profile = cProfile.Profile()
+            self.profiles.append(profile)
+            profile.enable()
+
+    def video_done(
+        self,
+    ) -> None:
+        """Called at every finished video, takes the snapshots of memory"""
+        if not self.active or not self.memory_every:
+            return
+        with CrawlProfiler.lock:
+            self.videos += 1
+            if self.videos % self.memory_every:
+                return
+            snapshot = tracemalloc.take_snapshot()
+            snapshot.dump(f"{self.prefix}.video{self.videos}.tracemalloc")
+            # The first snapshot is kept for the growth in the summary
+            self.snapshots = self.snapshots[:1] + [(self.videos, snapshot)]
+
+    def stop(
+        self,
+    ) -> str:
+        """Stops profiling, writes the dumps and returns the summary"""
+        if not self.active:
+            return ""
+        self.active = False
+        threading.setprofile(None)
+        # The profile of this thread is stopped first, the profiles of the
+        # threads of the run are collected from here after it
+        self.profiles[0].disable()
+        stats = pstats.Stats(self.profiles[0])
+        for profile in self.profiles[1:]:
+            profile.create_stats()
+            if profile.stats:
+                stats.add(profile)
+        stats.dump_stats(f"{self.prefix}.pstats")
+
+        summary = self.summary(stats)
+        with open(f"{self.prefix}.txt", "w") as file:
+            file.write(summary)
+
+        if self.tracing:
+            tracemalloc.stop()
+            self.tracing = False
+        with CrawlProfiler.lock:
+            CrawlProfiler.running = None
+        return summary
+
+    def summary(
+        self,
+        stats: pstats.Stats,
+    ) -> str:
+        """The top functions by their own and cumulative time and the memory growth"""
+        output = io.StringIO()
+        stats.stream = output
+        output.write(f"Profile of {len(self.profiles)} threads\n")
+        stats.sort_stats(pstats.SortKey.TIME).print_stats(self.top)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+
+        if self.snapshots:
+            videos, last = self.snapshots[-1]
+            output.write(f"Largest allocations after {videos} videos:\n")
+            for statistic in last.statistics("lineno")[: self.top]:
+                output.write(f"{statistic}\n")
+        if len(self.snapshots) > 1:
+            videos, first = self.snapshots[0]
+            output.write(f"\nGrowth since {videos} videos:\n")
+            for statistic in last.compare_to(first, "lineno")[: self.top]:
+                output.write(f"{statistic}\n")
+
+        return output.getvalue()
@@ -0,0 +1,60 @@
+"""
+Full-text search of comments over the comments_fts FTS5 index.
+The functions take any sqlite3 connection, so the GUI and the command line can
+search read-only connections.
+"""
+import re
+import sqlite3
+
+
+# "a phrase" in quotes or a single word, a word ending with * is a prefix
+TERM = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def match_query(
+    text: str,
+) -> str:
+    """
+    Function for converting a search text into an FTS5 query.
+    Every word and "quoted phrase" has to match, `word*` matches words starting
+    with it. All terms are quoted, so FTS5 syntax in the text can't break the query.
+    """
+    terms = []
+    for phrase, word in TERM.findall(text):
+        if phrase.strip():
+            terms.append('"' + phrase + '"')
+        elif word:
+            prefix = word.endswith("*")
+            word = word.rstrip("*")
+            if word:
+                terms.append('"' + word.replace('"', '""') + '"' + "*" * prefix)
+
+    return " ".join(terms)
+
+
+def search_comments(
+    connection: sqlite3.Connection,
+    text: str,
+    limit: int = 100,
+) -> list:
+    """
+    Function for finding comments by a search text.
+    Returns (comment_id, user_name, snippet) rows, the best matches first.
+    The matched words are marked with [brackets] in the snippets.
+    """
+    query = match_query(text)
+    if not query:
+        return []
+
+    return connection.execute(
+        """
+        SELECT comments.comment_id, users.user_name, snippet(comments_fts, 0, '[', ']', '...', 16)
+        FROM comments_fts
+        JOIN comments ON comments.comment_id = comments_fts.rowid
+        LEFT JOIN users ON users.user_id = comments.user_id
+        WHERE comments_fts MATCH ?
+        ORDER BY rank
+        LIMIT ?
+        """,
+        (query, limit),
+    ).fetchall()
@@ -0,0 +1,191 @@
+import threading
+import time
+
+from contextlib import contextmanager
+from typing import Iterator
+from requests import Response
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, Timeout
+
+
+class TokenBucket:
+    """
+    Token bucket limiting the rate of requests to `rate` per second with bursts
+    of up to `burst` requests. It can be paused, e.g. for the Retry-After of a 429.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int = None,
+    ) -> None:
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(
+        self,
+    ) -> None:
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.burst, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                else:
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(
+        self,
+        seconds: float,
+    ) -> None:
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD limit of the requests in flight.
+    Every fast enough response adds 1/limit to the limit (about +1 per round of
+    requests), a throttled one halves it. Like in TCP, the limit is halved at most
+    once per round: only requests started after the last decrease can decrease it.
+    """
+
+    def __init__(
+        self,
+        initial: int = 4,
+        minimum: int = 1,
+        maximum: int = 32,
+        target_latency: float = 2.0,
+    ) -> None:
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.active = 0
+        self.decreased = 0.0
+        self.condition = threading.Condition()
+
+    def acquire(
+        self,
+    ) -> float:
+        """Waits for a free slot, returns the time the request started"""
+        with self.condition:
+            while self.active >= int(self.limit):
+                self.condition.wait()
+            self.active += 1
+            return time.monotonic()
+
+    def release(
+        self,
+        start: float,
+        throttled: bool,
+    ) -> None:
+        with self.condition:
+            self.active -= 1
+            now = time.monotonic()
+            if throttled:
+                if start >= self.decreased:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self.decreased = now
+            elif now - start <= self.target_latency:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+
+class RateLimiter:
+    """Global limits shared by all the sessions of a crawl: a rate and an adaptive concurrency"""
+
+    def __init__(
+        self,
+        rate: float = 10.0,
+        burst: int = None,
+        concurrency: AdaptiveConcurrency = None,
+    ) -> None:
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = concurrency or AdaptiveConcurrency()
+
+    @contextmanager
+    def request(
+        self,
+    ) -> Iterator[dict]:
+        """
+        Waits for a token and a free slot for one request.
+        The caller sets result["throttled"] when the server asked to slow down.
+        """
+        self.bucket.acquire()
+        start = self.concurrency.acquire()
+        result = {"throttled": False}
+        try:
+            yield result
+        except (ConnectionError, Timeout):
+            result["throttled"] = True
+            raise
+        finally:
+            self.concurrency.release(start, result["throttled"])
+
+
+class ThrottledAdapter(HTTPAdapter):
+    """
+    Transport adapter sending requests through a RateLimiter.
+    Responses with 429 or 5xx status, and connection errors, are retried up to
+    `retries` times, after the Retry-After of the response or an exponential backoff.
+    """
+
+    throttle_statuses = frozenset((429, 500, 502, 503, 504))
+
+    def __init__(
+        self,
+        limiter: RateLimiter,
+        retries: int = 8,
+        backoff: float = 1.0,
+        **kwargs,
+    ) -> None:
+        super().__init__(**kwargs)
+        self.limiter = limiter
+        self.retries = retries
+        self.backoff = backoff
+
+    def send(
+        self,
+        request,
+        **kwargs,
+    ) -> Response:
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            try:
+                with self.limiter.request() as result:
+                    response = super().send(request, **kwargs)
+                    result["throttled"] = response.status_code in self.throttle_statuses
+            except (ConnectionError, Timeout):
+                if last_attempt:
+                    raise
+                time.sleep(self.backoff * 2**attempt)
+                continue
+
+            if not result["throttled"] or last_attempt:
+                return response
+
+            delay = self.retry_after(response) or self.backoff * 2**attempt
+            self.limiter.bucket.pause(delay)
+            response.close()
+
+    @staticmethod
+    def retry_after(
+        response: Response,
+    ) -> float:
+        try:
+            return float(response.headers.get("Retry-After", 0))
+        except ValueError:
+            return 0.0
@@ -0,0 +1,60 @@
+"""
+Queries of users by their comment counters in the user_stats table.
+The counters are kept up to date by triggers, so these queries are scans of
+an index of user_stats instead of aggregations over all the comments.
+The functions take any sqlite3 connection, like crawler.search.
+"""
+import sqlite3
+
+
+# Orders of top_users and the indexed user_stats columns they scan
+ORDERS = {
+    "comments": "comment_count",
+    "likes": "total_likes",
+    "recent": "last_comment_date",
+}
+
+
+def users_with_comments(
+    connection: sqlite3.Connection,
+    min_count: int,
+    limit: int = -1,
+) -> list:
+    """
+    Function for finding the users with at least `min_count` comments.
+    Returns (user_name, comment_count) rows, the most active users first.
+    """
+    return connection.execute(
+        """
+        SELECT users.user_name, user_stats.comment_count
+        FROM user_stats
+        JOIN users ON users.user_id = user_stats.user_id
+        WHERE user_stats.comment_count >= ?
+        ORDER BY user_stats.comment_count DESC
+        LIMIT ?
+        """,
+        (min_count, limit),
+    ).fetchall()
+
+
+def top_users(
+    connection: sqlite3.Connection,
+    order: str = "comments",
+    limit: int = 10,
+) -> list:
+    """
+    Function for finding the `limit` top users by one of the ORDERS.
+    Returns (user_name, comment_count, total_likes, last_comment_date) rows.
+    """
+    column = ORDERS[order]
+    return connection.execute(
+        f"""
+        SELECT users.user_name, user_stats.comment_count, user_stats.total_likes, user_stats.last_comment_date
+        FROM user_stats
+        JOIN users ON users.user_id = user_stats.user_id
+        WHERE user_stats.{column} IS NOT NULL
+        ORDER BY user_stats.{column} DESC
+        LIMIT ?
+        """,
+        (limit,),
+    ).fetchall()
@@ -1,5 +1,6 @@
 from tkinter import ttk
 from tkinter import Tk
+from crawler.db import connections
 from gui.crawler_tab import CrawlerTab
 from gui.database_executor_tab import DataBaseExecutorTab
 from gui.database_search_tab import DataBaseSearch
@@ -7,22 +8,36 @@ from gui.database_view_tab import DataBaseView
 
 
 class MyApplication:
-    """Сlass for YouTube Crawler application"""
+    """
+    Сlass for YouTube Crawler application.
+    All the tabs work with the database at `db_path`, the viewing tabs share the
+    read-only connections of its ConnectionManager. The database is created or
+    migrated to the current schema at startup, before any tab reads it.
+    """
 
     def __init__(
         self,
         root: Tk,
+        db_path: str = "youtube.db",
     ) -> None:
         self.root = root
+        self.connections = connections(db_path)
+        self.connections.writer().initialize()
         self.root.title("YouTube Crawler")
         self.root.geometry("625x300")
         self.root.resizable(width=False, height=False)
 
         self.tab_control = ttk.Notebook(root)
 
-        CrawlerTab(tab_control=self.tab_control).tab_render()
-        DataBaseView(tab_control=self.tab_control).tab_render()
-        DataBaseExecutorTab(tab_control=self.tab_control).tab_render()
-        DataBaseSearch(tab_control=self.tab_control).tab_render()
+        CrawlerTab(tab_control=self.tab_control, db_path=db_path).tab_render()
+        DataBaseView(
+            tab_control=self.tab_control, connections=self.connections
+        ).tab_render()
+        DataBaseExecutorTab(
+            tab_control=self.tab_control, connections=self.connections
+        ).tab_render()
+        DataBaseSearch(
+            tab_control=self.tab_control, connections=self.connections
+        ).tab_render()
 
         self.tab_control.pack()
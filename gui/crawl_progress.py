@@ -0,0 +1,113 @@
+import collections
+import queue
+import time
+
+from crawler.metrics import CrawlStats
+
+
+class CrawlProgress:
+    """
+    Class for reporting the progress of a crawl running on another thread.
+    The crawler thread only puts events into `events`, with callback() as the
+    progress_callback of load_channel and finish() at the end; it never
+    touches Tk. The Tk thread calls poll() at a fixed rate, which drains all
+    the events that arrived since the last call, however many there are, and
+    returns one report:
+        progress  percent of the crawl, resumed videos included
+        videos    videos finished by this run
+        comments_per_second, requests_per_second
+                  rates over the last `window` seconds, from the CrawlStats
+        eta       estimated seconds left, None until there is progress
+        done      whether the crawl has finished
+        error     the exception that stopped the crawl, if any
+    """
+
+    def __init__(
+        self,
+        stats: CrawlStats,
+        window: float = 5.0,
+    ) -> None:
+        self.stats = stats
+        self.window = window
+        self.events = queue.SimpleQueue()
+        self.first_progress = None
+        self.progress = 0.0
+        self.done = False
+        self.error = None
+        # (time, comments, requests) samples of the last `window` seconds
+        self.samples = collections.deque()
+
+    def callback(
+        self,
+        progress: float,
+    ) -> None:
+        self.events.put(("progress", progress, time.perf_counter()))
+
+    def finish(
+        self,
+        error: BaseException = None,
+    ) -> None:
+        self.events.put(("done", error, time.perf_counter()))
+
+    def poll(
+        self,
+    ) -> dict:
+        while True:
+            try:
+                kind, value, at = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == "progress":
+                if self.first_progress is None:
+                    self.first_progress = (at, value)
+                self.progress = value
+            else:
+                self.done = True
+                self.error = value
+
+        now = time.perf_counter()
+        comments = self.stats.value("rows", table="comments")
+        requests, _ = self.stats.total("http")
+        self.samples.append((now, comments, requests))
+        while len(self.samples) > 2 and now - self.samples[1][0] >= self.window:
+            self.samples.popleft()
+
+        then, old_comments, old_requests = self.samples[0]
+        elapsed = max(now - then, 1e-6)
+
+        return {
+            "progress": self.progress,
+            "videos": self.stats.value("videos"),
+            "comments_per_second": (comments - old_comments) / elapsed,
+            "requests_per_second": (requests - old_requests) / elapsed,
+            "eta": self.eta(now),
+            "done": self.done,
+            "error": self.error,
+        }
+
+    def eta(
+        self,
+        now: float,
+    ) -> float:
+        """Seconds left at the average speed since the first progress of the run"""
+        if self.first_progress is None:
+            return None
+        then, start = self.first_progress
+        rate = (self.progress - start) / max(now - then, 1e-6)
+        if rate <= 0:
+            return None
+        return (100 - self.progress) / rate
+
+    @staticmethod
+    def format(
+        report: dict,
+    ) -> str:
+        text = (
+            f"{report['progress']:.0f}%, {report['videos']:,} videos done, "
+            f"{report['comments_per_second']:,.0f} comments/s, "
+            f"{report['requests_per_second']:,.1f} requests/s"
+        )
+        if report["eta"] is not None and not report["done"]:
+            minutes, seconds = divmod(round(report["eta"]), 60)
+            text += f", ETA {minutes}:{seconds:02d}"
+        return text
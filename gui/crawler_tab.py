@@ -4,15 +4,25 @@ import tkinter as tk
 from tkinter import ttk
 from crawler.crawler import YouTubeCrawler
 from crawler.db import Database
+from gui.crawl_progress import CrawlProgress
 
 
 class CrawlerTab:
-    """Сlass that creates a tab with a YouTube crawler"""
+    """
+    Сlass that creates a tab with a YouTube crawler.
+    The crawler runs on its own thread and reports to a CrawlProgress, which
+    the Tk loop polls every poll_interval ms, so widgets are only touched by
+    the Tk thread and the load on it doesn't depend on the crawler.
+    """
+
+    poll_interval = 200
 
     def __init__(
         self,
         tab_control: ttk.Notebook,
+        db_path: str = "youtube.db",
     ) -> None:
+        self.db_path = db_path
         self.db_tab = self.add_tab(tab_control=tab_control)
 
     def tab_render(
@@ -78,24 +88,43 @@ class CrawlerTab:
         progress_label = ttk.Label(self.db_tab, text="Crawler process")
         progress_label.grid(row=5, column=0, columnspan=2)
 
-        def update_progress(
-            progress: int,
-        ) -> None:
-            progress_var.set(progress)
+        stats_label = ttk.Label(self.db_tab, text="", justify="left")
+        stats_label.grid(row=6, column=0, columnspan=2)
 
-            if progress >= 100.0:
-                progress_bar.grid_forget()
-                progress_label.config(text="Well Done!")
+        progress = CrawlProgress(crawler.stats)
 
         def start_crawling() -> None:
-            crawler.load_channel(
-                video_amount=video_amount,
-                comment_amount=comment_amount,
-                progress_callback=update_progress,
-            )
+            try:
+                crawler.load_channel(
+                    video_amount=video_amount,
+                    comment_amount=comment_amount,
+                    progress_callback=progress.callback,
+                    path=self.db_path,
+                )
+            except Exception as error:
+                progress.finish(error)
+                raise
+            progress.finish()
+
+        def poll_progress() -> None:
+            report = progress.poll()
+            progress_var.set(report["progress"])
+            stats_label.config(text=CrawlProgress.format(report))
+
+            if not report["done"]:
+                self.db_tab.after(self.poll_interval, poll_progress)
+                return
+
+            progress_bar.grid_forget()
+            if report["error"] is not None:
+                progress_label.config(text=f"Failed: {report['error']}")
+            else:
+                progress_label.config(text="Well Done!")
+                stats_label.config(text=crawler.stats.summary())
 
         parser_thread = threading.Thread(target=start_crawling)
         parser_thread.start()
+        self.db_tab.after(self.poll_interval, poll_progress)
 
     def add_tab(
         self,
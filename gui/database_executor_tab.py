@@ -1,21 +1,36 @@
-import sqlite3
+import queue
+import time
 import tkinter as tk
 
 from tkinter import ttk, scrolledtext
+from crawler.db import ConnectionManager
+from gui.query_runner import QueryRunner
 
 
 class DataBaseExecutorTab:
-    """Class that creates a tab for the ability to send queries to the database"""
+    """
+    Class that creates a tab for the ability to send queries to the database.
+    Queries run on a QueryRunner thread, so that the application stays responsive
+    and a query can be cancelled. The connections are read-only, so queries
+    can't change the database.
+    """
+
+    poll_interval = 50
+    chunks_per_poll = 4
 
     def __init__(
         self,
         tab_control: ttk.Notebook,
+        connections: ConnectionManager,
     ) -> None:
+        self.connections = connections
         self.db_tab = self.add_tab(tab_control=tab_control)
 
     def tab_render(
         self,
     ) -> None:
+        self.runner = None
+
         self.query_entry = tk.Entry(self.db_tab, width=40, fg="gray")
         self.query_entry.grid(row=0, column=0, padx=10, pady=3)
         self.query_entry.insert(0, "Enter your query")
@@ -23,35 +38,133 @@ class DataBaseExecutorTab:
         self.query_entry.bind("<FocusOut>", self.on_entry_leave)
 
         result_label = ttk.Label(self.db_tab, text="Your result:")
-        result_label.grid(row=1, padx=10, pady=3, columnspan=2)
+        result_label.grid(row=1, column=0, padx=10, pady=3)
 
-        result_text = scrolledtext.ScrolledText(self.db_tab, width=72, height=10)
-        result_text.grid(row=2, padx=10, pady=3, columnspan=2)
+        row_cap_label = ttk.Label(self.db_tab, text="Row cap:")
+        row_cap_label.grid(row=1, column=1, pady=3)
+        self.row_cap = tk.IntVar(value=10000)
+        row_cap_box = tk.Spinbox(
+            self.db_tab,
+            from_=1,
+            to=10**9,
+            increment=1000,
+            width=10,
+            textvariable=self.row_cap,
+        )
+        row_cap_box.grid(row=1, column=2, pady=3)
 
-        execute_button = tk.Button(
+        result_text = scrolledtext.ScrolledText(self.db_tab, width=72, height=8)
+        result_text.grid(row=2, padx=10, pady=3, columnspan=3)
+
+        self.status_label = ttk.Label(self.db_tab, text="")
+        self.status_label.grid(row=3, padx=10, columnspan=3, sticky="w")
+        self.plan_label = ttk.Label(self.db_tab, text="", wraplength=580)
+        self.plan_label.grid(row=4, padx=10, columnspan=3, sticky="w")
+
+        self.execute_button = tk.Button(
             self.db_tab,
             text="Execute a request",
             command=lambda: self.execute_query(result_text),
         )
-        execute_button.grid(
+        self.execute_button.grid(
             row=0,
             column=1,
             padx=10,
             pady=3,
         )
 
+        self.cancel_button = tk.Button(
+            self.db_tab,
+            text="Cancel",
+            state="disabled",
+            command=self.cancel_query,
+        )
+        self.cancel_button.grid(
+            row=0,
+            column=2,
+            pady=3,
+        )
+
     def execute_query(
         self,
         result_text: scrolledtext.ScrolledText,
     ) -> None:
-        query = self.query_entry.get()
-
-        connection = sqlite3.connect("youtube.db")
-        results = connection.cursor().execute(query).fetchall()
-        connection.close()
+        """Starts the query on a worker thread, its rows are shown as they arrive"""
+        try:
+            row_cap = self.row_cap.get()
+        except tk.TclError:
+            row_cap = 10000
 
         result_text.delete(1.0, tk.END)
-        result_text.insert(tk.END, "\n".join(map(str, results)))
+        self.plan_label.config(text="")
+        self.status_label.config(text="Running...")
+        self.execute_button.config(state="disabled")
+        self.cancel_button.config(state="normal")
+
+        self.runner = QueryRunner(self.connections, self.query_entry.get(), row_cap)
+        self.runner.start()
+        self.started = time.perf_counter()
+        self.row_count = 0
+        self.poll_query(result_text)
+
+    def cancel_query(
+        self,
+    ) -> None:
+        if self.runner is not None:
+            self.runner.cancel()
+
+    def poll_query(
+        self,
+        result_text: scrolledtext.ScrolledText,
+    ) -> None:
+        """Moves the chunks of the worker into the widget, a few every poll_interval"""
+        finished = False
+        for _ in range(self.chunks_per_poll):
+            try:
+                event = self.runner.events.get_nowait()
+            except queue.Empty:
+                break
+
+            kind = event[0]
+            if kind == "plan":
+                self.plan_label.config(text="Query plan: " + "; ".join(event[1]))
+            elif kind == "columns":
+                result_text.insert(tk.END, str(tuple(event[1])) + "\n")
+            elif kind == "rows":
+                self.row_count += len(event[1])
+                result_text.insert(tk.END, "\n".join(map(str, event[1])) + "\n")
+            elif kind == "done":
+                _, count, elapsed, capped = event
+                text = self.stats(count, elapsed)
+                if capped:
+                    text += f", stopped at the row cap of {count:,}"
+                self.status_label.config(text=text)
+                finished = True
+            else:
+                _, message, elapsed = event
+                self.status_label.config(
+                    text=f"{message} after {self.stats(self.row_count, elapsed)}"
+                )
+                finished = True
+
+        if finished:
+            self.runner = None
+            self.execute_button.config(state="normal")
+            self.cancel_button.config(state="disabled")
+            return
+
+        self.status_label.config(
+            text=self.stats(self.row_count, time.perf_counter() - self.started)
+        )
+        self.db_tab.after(self.poll_interval, self.poll_query, result_text)
+
+    @staticmethod
+    def stats(
+        count: int,
+        elapsed: float,
+    ) -> str:
+        rate = count / max(elapsed, 1e-6)
+        return f"{count:,} rows in {elapsed:.2f} s ({rate:,.0f} rows/s)"
 
     def add_tab(
         self,
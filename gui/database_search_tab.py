@@ -1,14 +1,18 @@
-import sqlite3
 import tkinter as tk
 
 from tkinter import ttk, scrolledtext
+from crawler.db import ConnectionManager
+from crawler.search import search_comments
+from crawler.user_stats import ORDERS, top_users, users_with_comments
 
 
 class DataBaseSearch:
     def __init__(
         self,
         tab_control: ttk.Notebook,
+        connections: ConnectionManager,
     ) -> None:
+        self.connections = connections
         self.db_tab = self.add_tab(tab_control=tab_control)
 
     def tab_render(
@@ -17,7 +21,14 @@ class DataBaseSearch:
         search_label = ttk.Label(self.db_tab, text="Search by:")
         search_label.grid(row=0, column=0, pady=5)
 
-        search_options = ["User", "Date", "Channel", "Word", "Min messages"]
+        search_options = [
+            "User",
+            "Date",
+            "Channel",
+            "Word",
+            "Min messages",
+            "Top users",
+        ]
 
         search_var = tk.StringVar(self.db_tab)
         search_var.set(search_options[0])
@@ -53,40 +64,63 @@ class DataBaseSearch:
         search_text: str,
         result_text: scrolledtext.ScrolledText,
     ) -> None:
-        connection = sqlite3.connect("youtube.db")
-        cursor = connection.cursor()
-
-        if search_option == "User":
-            query = f"SELECT * FROM users WHERE user_name = '{search_text}'"
-            results = cursor.execute(query).fetchall()
-
-        elif search_option == "Date":
-            query = f"SELECT * FROM comments WHERE comment_date >= '{search_text}'"
-            results = cursor.execute(query).fetchall()
-
-        elif search_option == "Channel":
-            query = f"SELECT * FROM channels WHERE channel_name = '{search_text}'"
-            results = cursor.execute(query).fetchall()
-
-        elif search_option == "Word":
-            query = f"SELECT * FROM comments WHERE comment_text LIKE '%{search_text}%'"
-            results = cursor.execute(query).fetchall()
-
-        elif search_option == "Min messages":
-            query = f"""
-            SELECT users.user_name, COUNT(comments.comment_id)
-            FROM users
-            LEFT JOIN comments ON users.user_id = comments.user_id
-            GROUP BY users.user_name
-            HAVING COUNT(comments.comment_id) >= {search_text};
-            """
-            results = cursor.execute(query).fetchall()
-
-        connection.close()
+        try:
+            results = self.search(search_option, search_text)
+        except (KeyError, ValueError) as error:
+            results = [f"Invalid search: {error}"]
 
         result_text.delete(1.0, tk.END)
         result_text.insert(tk.END, "\n".join(map(str, results)))
 
+    def search(
+        self,
+        search_option: str,
+        search_text: str,
+    ) -> list:
+        """Runs a search, raises ValueError when `search_text` doesn't suit the option"""
+        with self.connections.reader() as connection:
+            cursor = connection.cursor()
+
+            if search_option == "User":
+                query = "SELECT * FROM users WHERE user_name = ?"
+                results = cursor.execute(query, (search_text,)).fetchall()
+
+            elif search_option == "Date":
+                # "2023-01-01" finds the comments since the date and
+                # "2023-01-01..2023-02-01" the ones between the dates,
+                # both are range scans of the comments_comment_date index
+                start, _, end = search_text.strip().partition("..")
+                query = """
+                SELECT * FROM comments
+                WHERE comment_date >= ? AND comment_date <= ?
+                ORDER BY comment_date
+                """
+                results = cursor.execute(
+                    query, (start.strip(), end.strip() or "9999-12-31")
+                ).fetchall()
+
+            elif search_option == "Channel":
+                query = "SELECT * FROM channels WHERE channel_name = ?"
+                results = cursor.execute(query, (search_text,)).fetchall()
+
+            elif search_option == "Word":
+                results = search_comments(connection, search_text)
+
+            elif search_option == "Min messages":
+                # The counters of user_stats are indexed, no comments are read
+                results = users_with_comments(connection, int(search_text))
+
+            elif search_option == "Top users":
+                # "10" finds the 10 users with the most comments,
+                # "10 likes" and "10 recent" order them by likes or activity
+                limit, _, order = search_text.strip().partition(" ")
+                order = order.strip() or "comments"
+                if order not in ORDERS:
+                    raise ValueError(f"order by one of {', '.join(ORDERS)}")
+                results = top_users(connection, order, int(limit))
+
+        return results
+
     def add_tab(
         self,
         tab_control: ttk.Notebook,
@@ -1,82 +1,216 @@
-import sqlite3
 import tkinter as tk
 
 from tkinter import ttk
+from crawler.db import ConnectionManager
+from gui.table_pager import TablePager
 
 
 class DataBaseView:
-    """Сlass that creates a tab for viewing a database in the form of a table"""
+    """
+    Сlass that creates a tab for viewing a database in the form of a table.
+    The table is virtualised: only a window of at most `max_rows` rows is kept in
+    the Treeview, pages are fetched by a TablePager while scrolling, and sorting
+    by an indexed column is done by SQL. The pager keeps one read-only connection
+    of `connections` while a table is shown.
+    """
+
+    page_size = 200
+    max_rows = 1000
 
     def __init__(
         self,
         tab_control: ttk.Notebook,
+        connections: ConnectionManager,
     ) -> None:
+        self.connections = connections
         self.db_tab = self.add_tab(tab_control=tab_control)
         self.treeview = None
+        self.scrollbar = None
+        self.connection = None
+        self.pager = None
+        self.keys = {}
+        self.at_start = True
+        self.at_end = True
+        self.loading = False
 
     def tab_render(
         self,
     ) -> None:
-        conn = sqlite3.connect("youtube.db")
-        cursor = conn.cursor()
-
-        def show_table() -> None:
-            conn = sqlite3.connect("youtube.db")
-            selected_table = table_var.get()
-
-            cursor.execute(f"PRAGMA table_info({selected_table})")
-            columns = [column[1] for column in cursor.fetchall()]
-
-            if self.treeview is None:
-                self.treeview = ttk.Treeview(self.db_tab, columns=(), show="headings")
-                self.treeview.pack(fill="both")
-
-            self.treeview["columns"] = columns
-            for column in columns:
-                self.treeview.heading(
-                    column,
-                    text=column,
-                    command=lambda c=column: sort_treeview(c, False),
-                )
-                self.treeview.column(column, width=100)
-
-            cursor.execute(f"SELECT * FROM {selected_table}")
+        with self.connections.reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT name, sql FROM sqlite_master WHERE type='table';")
             rows = cursor.fetchall()
 
-            for row in self.treeview.get_children():
-                self.treeview.delete(row)
-
-            for row in rows:
-                self.treeview.insert("", "end", values=row)
-
-        def sort_treeview(
-            col: str,
-            reverse: bool,
-        ) -> None:
-            data = [
-                (self.treeview.set(child, col), child)
-                for child in self.treeview.get_children("")
-            ]
-            data.sort(reverse=reverse)
-            for i, item in enumerate(data):
-                self.treeview.move(item[1], "", i)
-            self.treeview.heading(col, command=lambda: sort_treeview(col, not reverse))
-
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-        tables = [table[0] for table in cursor.fetchall()]
+        # Virtual tables and their shadow tables, e.g. the comments_fts index
+        virtual = [
+            name
+            for name, sql in rows
+            if sql and sql.upper().startswith("CREATE VIRTUAL")
+        ]
+        tables = [
+            name
+            for name, _ in rows
+            if not name.startswith("sqlite_")
+            and not any(name.startswith(table) for table in virtual)
+        ]
 
         table_var = tk.StringVar()
-        table_var.set(tables[0])
-        table_option_menu = tk.OptionMenu(self.db_tab, table_var, *tables)
+        table_var.set(tables[0] if tables else "")
+        table_option_menu = tk.OptionMenu(self.db_tab, table_var, *(tables or [""]))
         table_option_menu.pack()
 
         show_button = tk.Button(
             self.db_tab,
             text="Show the table",
-            command=show_table,
+            command=lambda: self.show_table(table_var.get()),
         )
         show_button.pack()
 
+        self.count_label = ttk.Label(self.db_tab, text="")
+        self.count_label.pack()
+
+    def show_table(
+        self,
+        table: str,
+    ) -> None:
+        if self.connection is None:
+            self.connection = self.connections.acquire()
+        self.pager = TablePager(self.connection, table, self.page_size)
+
+        if self.treeview is None:
+            frame = ttk.Frame(self.db_tab)
+            frame.pack(fill="both", expand=True)
+            self.scrollbar = ttk.Scrollbar(frame, orient="vertical")
+            self.scrollbar.pack(side="right", fill="y")
+            self.treeview = ttk.Treeview(
+                frame,
+                columns=(),
+                show="headings",
+                yscrollcommand=self.on_scroll,
+            )
+            self.treeview.pack(fill="both", expand=True)
+            self.scrollbar.config(command=self.treeview.yview)
+
+        self.treeview["columns"] = self.pager.columns
+        for column in self.pager.columns:
+            self.treeview.column(column, width=100)
+        self.render_headings()
+
+        self.count_label.config(text=f"~{self.pager.estimate_rows():,} rows")
+        self.reload()
+
+    def render_headings(
+        self,
+    ) -> None:
+        """Indexed columns can be sorted by a click, the sorted one shows its order"""
+        sorted_column = self.pager.sort_column
+        if sorted_column == "rowid":
+            sorted_column = self.pager.rowid_alias
+
+        for column in self.pager.columns:
+            text = column
+            if column == sorted_column:
+                text += " ▼" if self.pager.descending else " ▲"
+            command = ""
+            if column in self.pager.sortable:
+                command = lambda c=column: self.sort_by(c)
+            self.treeview.heading(column, text=text, command=command)
+
+    def sort_by(
+        self,
+        column: str,
+    ) -> None:
+        current = self.pager.sort_column
+        if current == "rowid":
+            current = self.pager.rowid_alias
+        self.pager.sort(
+            column, descending=column == current and not self.pager.descending
+        )
+        self.render_headings()
+        self.reload()
+
+    def reload(
+        self,
+    ) -> None:
+        """Shows the first page in the current order"""
+        self.treeview.delete(*self.treeview.get_children())
+        self.keys = {}
+        self.at_start = True
+        self.at_end = False
+        self.load_next()
+        self.treeview.yview_moveto(0)
+
+    def on_scroll(
+        self,
+        first: str,
+        last: str,
+    ) -> None:
+        """Loads a page when the view gets close to an end of the loaded window"""
+        self.scrollbar.set(first, last)
+        if self.loading:
+            return
+        if float(last) > 0.9 and not self.at_end:
+            self.loading = True
+            self.treeview.after_idle(self.load_next)
+        elif float(first) < 0.1 and not self.at_start:
+            self.loading = True
+            self.treeview.after_idle(self.load_previous)
+
+    def load_next(
+        self,
+    ) -> None:
+        children = self.treeview.get_children()
+        key = self.keys[children[-1]] if children else None
+        rows = self.pager.fetch(key)
+        self.at_end = len(rows) < self.page_size
+
+        for row in rows:
+            item = self.treeview.insert("", "end", values=row[1:])
+            self.keys[item] = self.pager.key(row)
+
+        children = self.treeview.get_children()
+        excess = len(children) - self.max_rows
+        if excess > 0:
+            top = self.top_index()
+            self.delete(children[:excess])
+            self.at_start = False
+            self.treeview.yview_moveto((top - excess) / (len(children) - excess))
+        self.loading = False
+
+    def load_previous(
+        self,
+    ) -> None:
+        children = self.treeview.get_children()
+        rows = self.pager.fetch(self.keys[children[0]], forward=False)
+        self.at_start = len(rows) < self.page_size
+
+        top = self.top_index()
+        for index, row in enumerate(rows):
+            item = self.treeview.insert("", index, values=row[1:])
+            self.keys[item] = self.pager.key(row)
+
+        children = self.treeview.get_children()
+        excess = len(children) - self.max_rows
+        if excess > 0:
+            self.delete(children[-excess:])
+            self.at_end = False
+        self.treeview.yview_moveto((top + len(rows)) / (len(children) - max(excess, 0)))
+        self.loading = False
+
+    def top_index(
+        self,
+    ) -> int:
+        """Index of the first visible row"""
+        return round(self.treeview.yview()[0] * len(self.treeview.get_children()))
+
+    def delete(
+        self,
+        items: tuple,
+    ) -> None:
+        self.treeview.delete(*items)
+        for item in items:
+            del self.keys[item]
+
     def add_tab(
         self,
         tab_control: ttk.Notebook,
@@ -0,0 +1,99 @@
+import queue
+import sqlite3
+import threading
+import time
+
+from crawler.db import ConnectionManager
+
+
+class QueryRunner:
+    """
+    Class for running an SQL query on a worker thread.
+    The worker takes a read-only connection of `connections` and streams the rows in chunks of
+    `chunk_size` with fetchmany, stopping after `row_cap` rows. Everything it
+    produces is put into `events` for the Tk thread to poll, the worker waits
+    while `max_chunks` of them haven't been taken yet:
+        ("plan", lines)      the EXPLAIN QUERY PLAN of the query,
+        ("columns", names)   the column names, if the query returns rows,
+        ("rows", rows)       a chunk of rows,
+        ("done", count, elapsed, capped)
+        ("error", message, elapsed)
+    cancel() stops the query through the progress handler and interrupt().
+    """
+
+    def __init__(
+        self,
+        connections: ConnectionManager,
+        query: str,
+        row_cap: int = 10000,
+        chunk_size: int = 500,
+        max_chunks: int = 16,
+    ) -> None:
+        self.connections = connections
+        self.query = query
+        self.row_cap = max(1, row_cap)
+        self.chunk_size = chunk_size
+        self.events = queue.Queue(max_chunks)
+        self.cancelled = threading.Event()
+        self.connection = None
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(
+        self,
+    ) -> None:
+        self.thread.start()
+
+    def cancel(
+        self,
+    ) -> None:
+        self.cancelled.set()
+        # The lock keeps the connection from going back to the pool meanwhile,
+        # otherwise the next query on it could be interrupted
+        with self.lock:
+            if self.connection is not None:
+                self.connection.interrupt()
+
+    def run(
+        self,
+    ) -> None:
+        start = time.perf_counter()
+        connection = self.connections.acquire()
+        # Called every 1000 virtual machine instructions, a non-zero result
+        # aborts the query, so cancel() works between interrupt() calls too
+        connection.set_progress_handler(lambda: int(self.cancelled.is_set()), 1000)
+        with self.lock:
+            self.connection = connection
+
+        try:
+            try:
+                plan = connection.execute(f"EXPLAIN QUERY PLAN {self.query}")
+                self.events.put(("plan", [row[-1] for row in plan]))
+            except sqlite3.Error:
+                pass
+
+            cursor = connection.execute(self.query)
+            if cursor.description:
+                self.events.put(
+                    ("columns", [column[0] for column in cursor.description])
+                )
+
+            count = 0
+            while count < self.row_cap and not self.cancelled.is_set():
+                rows = cursor.fetchmany(min(self.chunk_size, self.row_cap - count))
+                if not rows:
+                    break
+                count += len(rows)
+                self.events.put(("rows", rows))
+
+            capped = count >= self.row_cap and cursor.fetchone() is not None
+            if self.cancelled.is_set():
+                raise sqlite3.OperationalError("interrupted")
+            self.events.put(("done", count, time.perf_counter() - start, capped))
+        except sqlite3.Error as error:
+            self.events.put(("error", str(error), time.perf_counter() - start))
+        finally:
+            with self.lock:
+                self.connection = None
+            connection.set_progress_handler(None, 0)
+            self.connections.release(connection)
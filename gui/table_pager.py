@@ -0,0 +1,159 @@
+import sqlite3
+
+
+class TablePager:
+    """
+    Class for reading a table page by page without OFFSET.
+    Every page continues from the (sort value, rowid) key of a row of the last
+    one, so reading a page costs the same at any depth of the table. Tables can
+    be sorted by their rowid and by the columns starting an index, so that
+    ORDER BY is an index scan instead of a sort of the whole table.
+    Rows are returned with their rowid as the first value.
+    """
+
+    def __init__(
+        self,
+        connection: sqlite3.Connection,
+        table: str,
+        page_size: int = 200,
+    ) -> None:
+        self.connection = connection
+        self.table = table
+        self.page_size = page_size
+        info = connection.execute(f'PRAGMA table_info("{table}")').fetchall()
+        self.columns = [row[1] for row in info]
+        # An INTEGER PRIMARY KEY column is the rowid itself
+        keys = [row for row in info if row[5]]
+        self.rowid_alias = None
+        if len(keys) == 1 and keys[0][2].upper() == "INTEGER":
+            self.rowid_alias = keys[0][1]
+        self.sortable = {"rowid", self.rowid_alias} - {None} | self.indexed_columns()
+        self.sort_column = "rowid"
+        self.descending = False
+
+    def indexed_columns(
+        self,
+    ) -> set:
+        """Columns that are the first column of an index of the table"""
+        columns = set()
+        for index in self.connection.execute(f'PRAGMA index_list("{self.table}")'):
+            first = self.connection.execute(
+                f'PRAGMA index_info("{index[1]}")'
+            ).fetchone()
+            if first is not None and first[2] is not None:
+                columns.add(first[2])
+        return columns
+
+    def sort(
+        self,
+        column: str,
+        descending: bool = False,
+    ) -> None:
+        if column not in self.sortable:
+            raise ValueError(f"{column} isn't indexed, the table can't be sorted by it")
+        self.sort_column = "rowid" if column == self.rowid_alias else column
+        self.descending = descending
+
+    def estimate_rows(
+        self,
+    ) -> int:
+        """
+        Cheap estimate of the number of rows: the row count of ANALYZE when the
+        database has one, otherwise the largest rowid, which is exact for tables
+        nothing has been deleted from.
+        """
+        try:
+            row = self.connection.execute(
+                "SELECT stat FROM sqlite_stat1 WHERE tbl = ? ORDER BY idx IS NOT NULL",
+                (self.table,),
+            ).fetchone()
+            if row is not None:
+                return int(row[0].split()[0])
+        except sqlite3.OperationalError:
+            pass
+
+        return (
+            self.connection.execute(
+                f'SELECT MAX(rowid) FROM "{self.table}"'
+            ).fetchone()[0]
+            or 0
+        )
+
+    def key(
+        self,
+        row: tuple,
+    ) -> tuple:
+        """The (sort value, rowid) key of a row of a page"""
+        if self.sort_column == "rowid":
+            return row[0], row[0]
+        return row[1 + self.columns.index(self.sort_column)], row[0]
+
+    def conditions(
+        self,
+        key: tuple,
+        descending: bool,
+    ) -> list:
+        """
+        WHERE clauses with their parameters selecting the rows after `key`, in
+        the order they have to be read. SQLite puts NULLs first in ascending
+        order. Every clause is a range of the index of the sort column, which
+        ends with the rowid: the rest of the rows with the sort value of `key`
+        come first, then the rows after that value.
+        """
+        if key is None:
+            return [("1", ())]
+
+        column = f'"{self.sort_column}"' if self.sort_column != "rowid" else "rowid"
+        value, rowid = key
+        if self.sort_column == "rowid":
+            return [("rowid < ?" if descending else "rowid > ?", (rowid,))]
+
+        if descending:
+            if value is None:
+                return [(f"{column} IS NULL AND rowid < ?", (rowid,))]
+            return [
+                (f"{column} = ? AND rowid < ?", (value, rowid)),
+                (f"{column} < ?", (value,)),
+                (f"{column} IS NULL", ()),
+            ]
+
+        if value is None:
+            return [
+                (f"{column} IS NULL AND rowid > ?", (rowid,)),
+                (f"{column} IS NOT NULL", ()),
+            ]
+        return [
+            (f"{column} = ? AND rowid > ?", (value, rowid)),
+            (f"{column} > ?", (value,)),
+        ]
+
+    def fetch(
+        self,
+        key: tuple = None,
+        forward: bool = True,
+    ) -> list:
+        """
+        Returns the page after the row with `key`, or the page before it when not
+        `forward`, in the sort order. Without a key it is the first or the last page.
+        """
+        descending = self.descending != (not forward)
+        order = "DESC" if descending else "ASC"
+        column = f'"{self.sort_column}"' if self.sort_column != "rowid" else "rowid"
+
+        rows = []
+        for condition, params in self.conditions(key, descending):
+            rows += self.connection.execute(
+                f"""
+                SELECT rowid, * FROM "{self.table}"
+                WHERE {condition}
+                ORDER BY {column} {order}, rowid {order}
+                LIMIT ?
+                """,
+                (*params, self.page_size - len(rows)),
+            ).fetchall()
+            if len(rows) >= self.page_size:
+                break
+
+        if not forward:
+            rows.reverse()
+        return rows
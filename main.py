@@ -1,7 +1,12 @@
 if __name__ == "__main__":
+    import argparse
     import tkinter as tk
     from gui.app import MyApplication
 
+    parser = argparse.ArgumentParser(description="YouTube Crawler application")
+    parser.add_argument("--db", default="youtube.db", help="SQLite database path")
+    args = parser.parse_args()
+
     root = tk.Tk()
-    app = MyApplication(root)
+    app = MyApplication(root, db_path=args.db)
     root.mainloop()